@@ -1,6 +1,5 @@
 # app.py
 import pygame
-import os
 
 # --------------------------------------------------------------------------
 #                               CONSTANTS
@@ -10,11 +9,47 @@ WIDTH = 800
 HEIGHT = 600
 FPS = 60
 
+# size of the whole arena, the screen shows the WIDTH x HEIGHT part around the player
+WORLD_WIDTH = WIDTH * 4
+WORLD_HEIGHT = HEIGHT * 4
+# the floor is drawn in square chunks this many tiles wide
+CHUNK_TILES = 16
+# most rendered floor chunks kept in memory at once
+CHUNK_CACHE_SIZE = 16
+# sprites centred further than this outside the screen aren't drawn
+CULL_MARGIN = 64
+
+# the game logic always runs at this many ticks per second, all speeds are per tick
+TICK_RATE = FPS
+# frames are drawn as often as this allows (0 for no limit), with sprites
+# placed between their last two tick positions
+MAX_RENDER_FPS = 240
+# if drawing falls this far behind, the missed ticks are skipped instead
+MAX_TICKS_PER_FRAME = 8
+
 PLAYER_SPEED = 3
 DEFAULT_ENEMY_SPEED = 1
 
 SPAWN_MARGIN = 50
 
+# the waves of enemies, played in order. each one lasts `duration` ticks and
+# spawns `count` enemies every `interval` ticks, picked at random from
+# `types` (None for every type). after the last wave the table starts again
+# with one more enemy per spawn each time round
+WAVES = [
+    {"duration": 30 * FPS, "interval": 60, "count": 1, "types": None},
+    {"duration": 30 * FPS, "interval": 40, "count": 1, "types": ["orc", "undead"]},
+    {"duration": 30 * FPS, "interval": 60, "count": 2, "types": None},
+    {"duration": 20 * FPS, "interval": 90, "count": 2, "types": ["demon"]},
+    {"duration": 40 * FPS, "interval": 45, "count": 3, "types": None},
+]
+# most enemies alive at once, spawns are skipped while this many are alive
+MAX_LIVE_ENEMIES = 1000
+# spawning slows down while frames take longer than this share of a tick
+SPAWN_FRAME_BUDGET = 0.8
+# enemy objects created up front so early spawns don't allocate
+ENEMY_POOL_PREWARM = 256
+
 ENEMY_SCALE_FACTOR = 2
 PLAYER_SCALE_FACTOR = 2
 FLOOR_TILE_SCALE_FACTOR = 2
@@ -22,62 +57,183 @@ HEALTH_SCALE_FACTOR = 3
 
 PUSHBACK_DISTANCE = 80
 ENEMY_KNOCKBACK_SPEED = 5
+# only enemies this close (in pixels) are pushed back when the player is hit,
+# None pushes back every enemy on the map by the full distance
+KNOCKBACK_RADIUS = 240
+# how the push fades with distance: PUSHBACK_DISTANCE * (1 - d / radius) ** falloff,
+# so 0 pushes everything in range equally and 1 fades linearly
+KNOCKBACK_FALLOFF = 1.0
+
+GRID_CELL_SIZE = 64
+
+# enemies closer together than this (in pixels) steer apart, 0 turns it off
+SEPARATION_RADIUS = 28
+# how much steering apart counts against walking towards the player
+SEPARATION_WEIGHT = 1.5
+# at most this many enemies of each neighbouring cell push an enemy, with their
+# pushes scaled up to stand in for the rest, so a crowd can't make it quadratic
+SEPARATION_MAX_NEIGHBOURS = 8
+
+# a space bar volley is split between this many of the nearest enemies
+AUTO_AIM_TARGETS = 1
+# only enemies this close (in pixels) are aimed at, None for no limit
+AUTO_AIM_RANGE = None
+
+# most bullets that can be on screen at once, extra shots are dropped
+BULLET_POOL_CAPACITY = 4096
+
+# "dirty" only redraws and pushes the parts of the screen that changed (when the
+# camera moves it scrolls last frame and draws just the floor that came into
+# view, but still pushes the whole screen), "flip" redraws the whole background
+# and flips every frame
+RENDER_MODE = "dirty"
+# past this many changed areas in a frame the whole screen is pushed instead
+DIRTY_RECT_LIMIT = 200
+
+# most coins and powerups that can lie on the floor, the oldest go first
+MAX_PICKUPS = 512
+# ticks an uncollected coin or powerup stays on the floor
+PICKUP_LIFETIME = 30 * FPS
+# a coin dropped this close to another coin is added to its stack
+COIN_MERGE_RADIUS = 24
+# stack values at which coins are drawn bigger
+COIN_STACK_TIERS = (2, 5, 10)
+
+# draw order of the sprites queued each frame, lowest first
+LAYER_PICKUPS = 0
+LAYER_ENEMIES = 1
+LAYER_PLAYER = 2
+LAYER_BULLETS = 3
+
+# where pre-scaled images are cached between runs (None turns the cache off)
+ASSET_CACHE_FOLDER = ".asset_cache"
+# threads used to decode images and sounds at startup
+ASSET_LOADER_WORKERS = 4
+
+# mixer channels reserved for sound effects, the most that can play at once
+AUDIO_VOICES = 16
+# how many copies of one sound effect can play at once, by name
+AUDIO_SOUND_VOICES = {"enemy_death": 4, "coin_collection": 3, "player_death": 1}
+AUDIO_DEFAULT_VOICES = 2
+# volume of a sound effect asked for once in a tick
+AUDIO_VOLUME = 0.7
+# extra volume for each repeat of a sound merged into the same tick
+AUDIO_MERGE_BOOST = 0.15
+
+# number of recent frames the profiler's percentiles are computed over
+PROFILER_WINDOW = 300
+
+# how many rendered strings the HUD text cache keeps
+TEXT_CACHE_SIZE = 64
+# characters pre-rendered into the HUD glyph atlas
+ATLAS_CHARACTERS = "0123456789XPHS:/ "
+
+# "objects" keeps one Enemy object per enemy, "numpy" stores the whole horde
+# in arrays and updates it in a few batched operations (see horde.py)
+ENEMY_BACKEND = "objects"
+
+# split the numpy horde's update and grid bucketing into chunks run on a thread pool
+PARALLEL_UPDATE = False
+# threads used by the parallel update
+UPDATE_WORKERS = 4
+# fewest enemies worth handing to a thread of their own
+UPDATE_MIN_CHUNK = 2048
+
+# ticks between the snapshots kept for rewinding, and how many are kept
+SNAPSHOT_INTERVAL = 30
+SNAPSHOT_RING_SIZE = 20
+# how far back the rewind key goes, in ticks
+REWIND_TICKS = 5 * TICK_RATE
+# where the last snapshot is written if the game crashes
+CRASH_DUMP_PATH = "crash.snapshot"
+
+# address the co-op server listens on, port 0 picks any free port
+NET_HOST = "127.0.0.1"
+NET_PORT = 7777
+# positions are sent in steps of 1 / NET_POSITION_SCALE pixels, and can be up
+# to NET_POSITION_MARGIN pixels outside the world
+NET_POSITION_SCALE = 8
+NET_POSITION_MARGIN = 512
+# zlib level used on snapshots, 1 is fastest
+NET_COMPRESSION = 1
+# seconds a send to a client may block before that client is dropped
+NET_SEND_TIMEOUT = 0.5
+
+# keys bound to each action, any one of them works
+KEY_BINDINGS = {
+    "left": (pygame.K_LEFT, pygame.K_a),
+    "right": (pygame.K_RIGHT, pygame.K_d),
+    "up": (pygame.K_UP, pygame.K_w),
+    "down": (pygame.K_DOWN, pygame.K_s),
+    "shoot_nearest": (pygame.K_SPACE,),
+    "reset": (pygame.K_r,),
+    "back": (pygame.K_ESCAPE,),
+    "rewind": (pygame.K_BACKSPACE,),
+    "toggle_profiler": (pygame.K_F3,),
+}
+# mouse buttons bound to each action, shoot_at aims where the mouse is
+MOUSE_BINDINGS = {
+    "shoot_at": (1,),
+}
 
 # --------------------------------------------------------------------------
 #                       ASSET LOADING FUNCTIONS
 # --------------------------------------------------------------------------
 
-def load_frames(prefix, frame_count, scale_factor=1, folder="assets"):
-    frames = []
-    for i in range(frame_count):
-        image_path = os.path.join(folder, f"{prefix}_{i}.png")
-        img = pygame.image.load(image_path).convert_alpha()
-
-        if scale_factor != 1:
-            w = img.get_width() * scale_factor
-            h = img.get_height() * scale_factor
-            img = pygame.transform.scale(img, (w, h))
-
-        frames.append(img)
-    return frames
-
-def load_floor_tiles(folder="assets"):
-    floor_tiles = []
-    for i in range(8):
-        path = os.path.join(folder, f"floor_{i}.png")
-        tile = pygame.image.load(path).convert()
-
-        if FLOOR_TILE_SCALE_FACTOR != 1:
-            tw = tile.get_width() * FLOOR_TILE_SCALE_FACTOR
-            th = tile.get_height() * FLOOR_TILE_SCALE_FACTOR
-            tile = pygame.transform.scale(tile, (tw, th))
-
-        floor_tiles.append(tile)
-    return floor_tiles
+def flip_frames(frames):
+    """return left-facing copies of a list of right-facing animation frames."""
+    return [pygame.transform.flip(frame, True, False) for frame in frames]
+
+def load_assets(manager=None):
+    # images are decoded on the asset manager's worker threads: every request
+    # is started first, then each one is waited for and converted in turn
+    from asset_manager import AssetManager
+    own_manager = manager is None
+    if own_manager:
+        manager = AssetManager()
+
+    pending = {
+        "orc":         manager.request_frames("orc",         4, ENEMY_SCALE_FACTOR),
+        "undead":      manager.request_frames("undead",      4, ENEMY_SCALE_FACTOR),
+        "demon":       manager.request_frames("demon",       4, ENEMY_SCALE_FACTOR),
+        "player_idle": manager.request_frames("player_idle", 4, PLAYER_SCALE_FACTOR),
+        "player_run":  manager.request_frames("player_run",  4, PLAYER_SCALE_FACTOR),
+        "floor":       manager.request_frames("floor",       8, FLOOR_TILE_SCALE_FACTOR, alpha=False),
+        "health":      manager.request_frames("health",      6, HEALTH_SCALE_FACTOR),
+    }
 
-def load_assets():
     assets = {}
 
     # Enemies
     assets["enemies"] = {
-        "orc":    load_frames("orc",    4, scale_factor=ENEMY_SCALE_FACTOR),
-        "undead": load_frames("undead", 4, scale_factor=ENEMY_SCALE_FACTOR),
-        "demon":  load_frames("demon",  4, scale_factor=ENEMY_SCALE_FACTOR),
+        "orc":    manager.finish_frames(pending["orc"]),
+        "undead": manager.finish_frames(pending["undead"]),
+        "demon":  manager.finish_frames(pending["demon"]),
     }
 
     # Player
     assets["player"] = {
-        "idle": load_frames("player_idle", 4, scale_factor=PLAYER_SCALE_FACTOR),
-        "run":  load_frames("player_run",  4, scale_factor=PLAYER_SCALE_FACTOR),
+        "idle": manager.finish_frames(pending["player_idle"]),
+        "run":  manager.finish_frames(pending["player_run"]),
+    }
+
+    # Left-facing copies of every animation frame, so nothing is flipped while drawing
+    assets["enemies_flipped"] = {
+        name: flip_frames(frames) for name, frames in assets["enemies"].items()
+    }
+    assets["player_flipped"] = {
+        name: flip_frames(frames) for name, frames in assets["player"].items()
     }
 
     # Floor tiles
-    assets["floor_tiles"] = load_floor_tiles()
+    assets["floor_tiles"] = manager.finish_frames(pending["floor"])
 
     # Health images
-    assets["health"] = load_frames("health", 6, scale_factor=HEALTH_SCALE_FACTOR)
+    assets["health"] = manager.finish_frames(pending["health"])
 
     # Example coin image (uncomment if you have coin frames / images)
     # assets["coin"] = pygame.image.load(os.path.join("assets", "coin.png")).convert_alpha()
 
-    return assets
\ No newline at end of file
+    if own_manager:
+        manager.shutdown()
+    return assets
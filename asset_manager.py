@@ -0,0 +1,159 @@
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+import app
+
+# cached images are stored as a small header followed by the raw pixels
+CACHE_MAGIC = b"SHIC"
+CACHE_HEADER = struct.Struct("<4sII")
+
+
+class LazySound:
+    def __init__(self, load):
+        """a stand-in for a pygame Sound that is only loaded when first needed.
+
+        `load` returns the Sound, or a Future that will hold it.
+        """
+        self.load = load
+        self.sound = None
+
+    def get(self):
+        """return the real Sound, loading it now if needed."""
+        if self.sound is None:
+            sound = self.load()
+            self.sound = sound.result() if hasattr(sound, "result") else sound
+        return self.sound
+
+    @property
+    def loaded(self):
+        return self.sound is not None
+
+    def play(self, *args, **kwargs):
+        return self.get().play(*args, **kwargs)
+
+    def stop(self):
+        # a sound that was never loaded can't be playing
+        if self.sound is not None:
+            self.sound.stop()
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+class LazyFont:
+    def __init__(self, path, size):
+        """a stand-in for a pygame Font that is only opened when first used."""
+        self.path = path
+        self.size_in_points = size
+        self.font = None
+
+    def get(self):
+        if self.font is None:
+            self.font = pygame.font.Font(self.path, self.size_in_points)
+        return self.font
+
+    def render(self, *args, **kwargs):
+        return self.get().render(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+class AssetManager:
+    def __init__(self, folder="assets", cache_folder=app.ASSET_CACHE_FOLDER,
+                 workers=app.ASSET_LOADER_WORKERS):
+        """load images and sounds on a thread pool, caching scaled images on disk.
+
+        set cache_folder to None to turn the disk cache off.
+        """
+        self.folder = folder
+        self.cache_folder = cache_folder
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        if cache_folder:
+            os.makedirs(cache_folder, exist_ok=True)
+
+    def shutdown(self):
+        """stop the worker threads once everything has been loaded."""
+        self.executor.shutdown(wait=True)
+
+    def cache_path(self, path, scale_factor, alpha):
+        """return where the scaled copy of an image is cached.
+
+        the file's modification time is part of the name, so editing an image
+        automatically misses the old cache entry.
+        """
+        mtime = os.stat(path).st_mtime_ns
+        stem = os.path.splitext(os.path.basename(path))[0]
+        mode = "rgba" if alpha else "rgb"
+        return os.path.join(self.cache_folder, f"{stem}_x{scale_factor}_{mode}_{mtime}.raw")
+
+    def decode_image(self, path, scale_factor, alpha):
+        """load and scale an image, returning its raw pixels (runs on a worker thread)."""
+        mode = "RGBA" if alpha else "RGB"
+        cache_path = self.cache_path(path, scale_factor, alpha) if self.cache_folder else None
+
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "rb") as f:
+                data = f.read()
+            magic, w, h = CACHE_HEADER.unpack_from(data, 0)
+            if magic == CACHE_MAGIC:
+                return mode, (w, h), data[CACHE_HEADER.size:]
+
+        img = pygame.image.load(path)
+        if scale_factor != 1:
+            w = img.get_width() * scale_factor
+            h = img.get_height() * scale_factor
+            img = pygame.transform.scale(img, (w, h))
+        pixels = pygame.image.tobytes(img, mode)
+
+        if cache_path:
+            # write to a temporary name first so a half-written file is never read
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(CACHE_HEADER.pack(CACHE_MAGIC, *img.get_size()))
+                f.write(pixels)
+            os.replace(tmp_path, cache_path)
+        return mode, img.get_size(), pixels
+
+    def request_image(self, name, scale_factor=1, alpha=True):
+        """start loading assets/<name>.png in the background and return a Future."""
+        path = os.path.join(self.folder, f"{name}.png")
+        return self.executor.submit(self.decode_image, path, scale_factor, alpha)
+
+    def request_frames(self, prefix, frame_count, scale_factor=1, alpha=True):
+        """start loading <prefix>_0.png .. <prefix>_<n-1>.png in the background."""
+        return [
+            self.request_image(f"{prefix}_{i}", scale_factor, alpha)
+            for i in range(frame_count)
+        ]
+
+    def finish_image(self, future):
+        """wait for an image and turn it into a display-ready Surface.
+
+        converting to the display format has to happen on the main thread.
+        """
+        mode, size, pixels = future.result()
+        img = pygame.image.frombytes(pixels, size, mode)
+        return img.convert_alpha() if mode == "RGBA" else img.convert()
+
+    def finish_frames(self, futures):
+        return [self.finish_image(future) for future in futures]
+
+    def sound(self, path, lazy=False):
+        """return a sound that is decoded in the background.
+
+        a lazy sound isn't decoded at all until it is first played.
+        """
+        if lazy:
+            return LazySound(lambda: pygame.mixer.Sound(path))
+        future = self.executor.submit(pygame.mixer.Sound, path)
+        return LazySound(lambda: future)
+
+    def font(self, path, size, lazy=False):
+        """return a font, opened straight away or on first use."""
+        if lazy:
+            return LazyFont(path, size)
+        return pygame.font.Font(path, size)
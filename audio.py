@@ -0,0 +1,85 @@
+from collections import Counter
+
+import pygame
+
+import app
+
+
+class AudioBus:
+    def __init__(self, asset_manager, null=False, voices=app.AUDIO_VOICES):
+        """play sound effects through a fixed set of reserved mixer channels.
+
+        sounds asked for during a tick are only queued. flush() then plays each
+        one at most once, a little louder when several were asked for, as long
+        as the sound hasn't used up its own voices and a channel is free.
+        with null=True (or no working mixer) nothing is loaded or played, the
+        plays are only counted.
+        """
+        self.asset_manager = asset_manager
+        self.null = null or pygame.mixer.get_init() is None
+        # name -> sound, and how many channels each sound may use at once
+        self.sounds = {}
+        self.limits = {}
+        # name -> how many times it was asked for since the last flush
+        self.pending = Counter()
+        # how many times each sound was actually played, and how many were dropped
+        self.played = Counter()
+        self.dropped = 0
+
+        self.channels = []
+        # name of the sound last started on each channel
+        self.channel_names = []
+        if not self.null:
+            # keep these channels for the bus, so nothing else can take them
+            pygame.mixer.set_num_channels(max(voices, pygame.mixer.get_num_channels()))
+            pygame.mixer.set_reserved(voices)
+            self.channels = [pygame.mixer.Channel(i) for i in range(voices)]
+            self.channel_names = [None] * voices
+
+    def load(self, name, path, lazy=False, max_voices=None):
+        """register a sound effect under `name`, decoding it in the background."""
+        if max_voices is None:
+            max_voices = app.AUDIO_SOUND_VOICES.get(name, app.AUDIO_DEFAULT_VOICES)
+        self.limits[name] = max_voices
+        self.sounds[name] = None if self.null else self.asset_manager.sound(path, lazy=lazy)
+
+    def play(self, name):
+        """ask for a sound to be played at the end of this tick."""
+        self.pending[name] += 1
+
+    def stop(self, name):
+        """stop a sound everywhere it is playing, and drop it if it is queued."""
+        self.pending.pop(name, None)
+        for channel, playing in zip(self.channels, self.channel_names):
+            if playing == name:
+                channel.stop()
+
+    def flush(self):
+        """play everything queued since the last flush, merging repeats."""
+        if not self.pending:
+            return
+        pending = self.pending
+        self.pending = Counter()
+        if self.null:
+            self.played.update(pending.keys())
+            return
+
+        busy = [channel.get_busy() for channel in self.channels]
+        for name, count in pending.items():
+            voices = sum(
+                1 for is_busy, playing in zip(busy, self.channel_names)
+                if is_busy and playing == name
+            )
+            if voices >= self.limits[name] or all(busy):
+                self.dropped += 1
+                continue
+
+            i = busy.index(False)
+            channel = self.channels[i]
+            channel.play(self.sounds[name].get())
+            # several of the same sound at once play as one louder one
+            volume = app.AUDIO_VOLUME * (1 + app.AUDIO_MERGE_BOOST * (count - 1))
+            channel.set_volume(min(1.0, volume))
+            busy[i] = True
+            self.channel_names[i] = name
+            self.played[name] += 1
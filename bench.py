@@ -0,0 +1,385 @@
+# bench.py
+# run with: python3 bench.py [--out results.json] [--baseline baseline.json]
+#      or:  python3 bench.py --micro   for the smaller data structure benchmarks
+#      or:  python3 bench.py --network for the co-op server bandwidth and latency
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+import pygame
+
+import app
+from bullet import BulletPool
+from enemy import Enemy
+from flocking import separation_forces
+from horde import EnemyHorde
+from spatial import SpatialGrid
+
+
+def make_enemy_assets():
+    """build plain surfaces the same size as the real enemy sprites so no window is needed."""
+    sizes = {"orc": (32, 46), "undead": (32, 32), "demon": (64, 72)}
+    return {name: [pygame.Surface(size)] * 4 for name, size in sizes.items()}
+
+
+def field_size(count, spacing=80):
+    """size of a square field holding `count` enemies about `spacing` pixels apart."""
+    return max(app.WIDTH, int(spacing * count ** 0.5))
+
+
+def make_enemies(count, size, rng):
+    enemy_assets = make_enemy_assets()
+    types = list(enemy_assets.keys())
+    return [
+        Enemy(rng.uniform(0, size), rng.uniform(0, size), rng.choice(types), enemy_assets,
+              flipped_assets=enemy_assets)
+        for _ in range(count)
+    ]
+
+
+def make_bullets(count, size, rng):
+    """return the collision rects of `count` stationary bullets."""
+    bullets = BulletPool()
+    for _ in range(count):
+        bullets.spawn(rng.uniform(0, size), rng.uniform(0, size), [0], [0], 10)
+    return bullets.rects()
+
+
+def naive_collisions(bullets, enemies):
+    """the old all-pairs check, kept here only to compare against."""
+    hits = 0
+    for bullet_rect in bullets:
+        for enemy in enemies:
+            if bullet_rect.colliderect(enemy.rect):
+                hits += 1
+                break
+    return hits
+
+
+def grid_collisions(bullets, enemies, grid):
+    """rebuild the grid then test each bullet against its neighbouring enemies."""
+    grid.rebuild(enemies)
+    hits = 0
+    for bullet_rect in bullets:
+        if grid.colliding(bullet_rect):
+            hits += 1
+    return hits
+
+
+def time_call(func, *args, repeat=20):
+    """return the best time in milliseconds over several runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_collisions(enemy_counts=(100, 500, 1000, 2000, 4000), bullet_count=200):
+    """print how the collision cost grows with the number of enemies.
+
+    enemies are kept at the same density as the count grows, so the number of
+    real hits per bullet stays about the same and only the search cost changes.
+    """
+    rng = random.Random(0)
+    grid = SpatialGrid()
+
+    print(f"bullet-enemy collisions with {bullet_count} bullets (best of 20, ms)")
+    print(f"{'enemies':>8} {'naive':>10} {'grid':>10} {'speedup':>8}")
+    for count in enemy_counts:
+        size = field_size(count)
+        enemies = make_enemies(count, size, rng)
+        bullets = make_bullets(bullet_count, size, rng)
+        assert naive_collisions(bullets, enemies) == grid_collisions(bullets, enemies, grid)
+        naive_ms = time_call(naive_collisions, bullets, enemies, repeat=5)
+        grid_ms = time_call(grid_collisions, bullets, enemies, grid)
+        print(f"{count:>8} {naive_ms:>10.3f} {grid_ms:>10.3f} {naive_ms / grid_ms:>7.1f}x")
+
+
+def update_objects(enemies, player):
+    for enemy in enemies:
+        enemy.update(player)
+
+
+def bench_enemy_update(enemy_counts=(100, 1000, 10000)):
+    """print the cost of one Enemy.update pass for each enemy backend."""
+    rng = random.Random(0)
+    enemy_assets = make_enemy_assets()
+    player = pygame.Rect(app.WIDTH // 2, app.HEIGHT // 2, 0, 0)
+
+    print("enemy update per tick (best of 20, ms)")
+    print(f"{'enemies':>8} {'objects':>10} {'numpy':>10} {'speedup':>8}")
+    for count in enemy_counts:
+        enemies = make_enemies(count, field_size(count), rng)
+        horde = EnemyHorde(enemy_assets)
+        for enemy in enemies:
+            horde.spawn(enemy.x, enemy.y, enemy.enemy_type)
+        objects_ms = time_call(update_objects, enemies, player)
+        numpy_ms = time_call(horde.update, [player])
+        print(f"{count:>8} {objects_ms:>10.3f} {numpy_ms:>10.3f} {objects_ms / numpy_ms:>7.1f}x")
+
+
+def bench_separation(enemy_counts=(100, 1000, 10000), spacings=(80, 20)):
+    """print the cost of the flocking separation pass for spread out and crowded hordes."""
+    rng = np.random.default_rng(0)
+    print("separation forces per tick (best of 20, ms)")
+    print(f"{'enemies':>8} {'spacing':>8} {'ms':>10}")
+    for count in enemy_counts:
+        for spacing in spacings:
+            size = spacing * count ** 0.5
+            x = rng.uniform(0, size, count)
+            y = rng.uniform(0, size, count)
+            ms = time_call(separation_forces, x, y)
+            print(f"{count:>8} {spacing:>8} {ms:>10.3f}")
+
+
+def fire_and_update(bullets, volley_vx, volley_vy):
+    bullets.spawn(app.WIDTH / 2, app.HEIGHT / 2, volley_vx, volley_vy, 10)
+    bullets.update()
+
+
+def bench_bullets(volley_sizes=(1, 10, 100)):
+    """print the cost of firing a volley every tick and moving the whole pool."""
+    print("bullet pool, one volley fired per tick (ms per tick over 200 ticks)")
+    print(f"{'volley':>8} {'live':>8} {'ms':>10}")
+    for volley in volley_sizes:
+        bullets = BulletPool()
+        angles = np.linspace(0, 2 * np.pi, volley, endpoint=False)
+        volley_vx = np.cos(angles) * 10
+        volley_vy = np.sin(angles) * 10
+        start = time.perf_counter()
+        for _ in range(200):
+            fire_and_update(bullets, volley_vx, volley_vy)
+        elapsed = (time.perf_counter() - start) / 200 * 1000
+        print(f"{volley:>8} {len(bullets):>8} {elapsed:>10.3f}")
+
+
+def network_client(address, clients):
+    """a stand-in co-op client: send an input for every snapshot until the server closes."""
+    from inputs import TickInput
+    from netplay import CoopClient
+
+    client = CoopClient(address)
+    clients.append(client)
+    tick = 0
+    try:
+        while True:
+            client.send_input(TickInput(left=(tick // 60) % 2 == 0, up=(tick // 90) % 2 == 0,
+                                        shoot_nearest=tick % 10 == 0))
+            client.receive()
+            tick += 1
+    except OSError:
+        pass
+    finally:
+        client.close()
+
+
+def bench_network(enemy_counts=(1000, 10000, 50000), client_count=2, ticks=120):
+    """print the snapshot size and input latency of a co-op server on localhost.
+
+    the server ticks at TICK_RATE with stand-in clients in threads. latency is
+    the time from sending an input to getting back the first snapshot that
+    used it, so it includes waiting for the next tick, and grows once ticks
+    take longer than 1 / TICK_RATE.
+    """
+    from game import Game
+    from netplay import CoopServer
+
+    # spread over the whole world, as the clients' players can be anywhere in it
+    world = pygame.Rect(0, 0, app.WORLD_WIDTH, app.WORLD_HEIGHT)
+    print(f"co-op server, {client_count} clients over {ticks} ticks")
+    print(f"{'enemies':>8} {'raw B':>10} {'sent B':>10} {'ratio':>7} {'kB/s':>9} "
+          f"{'tick ms':>9} {'encode ms':>10} {'latency ms':>11} {'p95 ms':>8}")
+    for count in enemy_counts:
+        game = Game(enemy_backend="numpy", headless=True, seed=0)
+        game.director.max_enemies = 0
+        server = CoopServer(game, port=0)
+        clients = []
+        threads = [threading.Thread(target=network_client, args=(server.address, clients),
+                                    daemon=True) for _ in range(client_count)]
+        for thread in threads:
+            thread.start()
+        server.wait_for_clients(client_count)
+        for player in game.players:
+            player.health = UNDYING_HEALTH
+
+        tick_length = 1.0 / app.TICK_RATE
+        next_tick = time.perf_counter()
+        tick_seconds = 0.0
+        for _ in range(ticks):
+            server.wait_until(next_tick)
+            next_tick = max(next_tick + tick_length, time.perf_counter())
+            top_up(game, count, 0, world)
+            start = time.perf_counter()
+            server.step()
+            tick_seconds += time.perf_counter() - start
+        server.close()
+        for thread in threads:
+            thread.join()
+
+        snapshots = server.snapshots_sent
+        sent = (server.bytes_sent / snapshots) if snapshots else 0
+        raw = (server.raw_bytes / snapshots) if snapshots else 0
+        latencies = np.array([latency for client in clients for latency in client.latencies])
+        print(f"{count:>8} {raw:>10.0f} {sent:>10.0f} {raw / sent:>6.1f}x "
+              f"{sent * app.TICK_RATE / 1000:>9.1f} {tick_seconds / ticks * 1000:>9.2f} "
+              f"{server.encode_seconds / ticks * 1000:>10.3f} "
+              f"{np.median(latencies) * 1000:>11.2f} {np.percentile(latencies, 95) * 1000:>8.2f}")
+
+
+# --------------------------------------------------------------------------
+#                       HEADLESS GAME SCENARIOS
+# --------------------------------------------------------------------------
+
+# health that never runs out during a benchmark, kept an int so snapshots can store it
+UNDYING_HEALTH = 2**31 - 1
+
+# each scenario keeps a fixed number of entities alive while the game runs
+SCENARIOS = {
+    "enemies_100":        {"enemies": 100},
+    "enemies_1k":         {"enemies": 1000},
+    "enemies_10k":        {"enemies": 10000},
+    "enemies_10k_numpy":  {"enemies": 10000, "backend": "numpy"},
+    "enemies_50k_numpy":  {"enemies": 50000, "backend": "numpy"},
+    "enemies_50k_parallel": {"enemies": 50000, "backend": "numpy", "parallel": True},
+    "volley_200_bullets": {"enemies": 500, "bullet_count": 200},
+    "coins_5k":           {"enemies": 100, "coins": 5000},
+}
+
+# stages of Game.update and Game.draw reported for every scenario
+STAGES = [
+    "update", "draw", "enemies", "enemy grid", "player-enemy", "bullet-enemy",
+    "player-coin", "player-powerup", "draw enemies", "draw pickups", "draw blits",
+]
+
+
+def top_up(game, enemies, coins, area=None):
+    """spawn enemies and drop coins until the scenario's counts are reached again.
+
+    the pickup field merges and caps coins, so at most `coins` drops are tried.
+    everything goes inside `area`, by default the screen so it is all drawn
+    as well as updated.
+    """
+    rng = game.rng
+    types = list(game.assets["enemies"].keys())
+    view = area or game.camera.view
+    while len(game.enemies) < enemies:
+        game.spawn_enemy(rng.uniform(view.left, view.right), rng.uniform(view.top, view.bottom),
+                         rng.choice(types))
+    for _ in range(coins):
+        if len(game.pickups) >= min(coins, game.pickups.capacity):
+            break
+        game.pickups.add_coin(rng.uniform(view.left, view.right), rng.uniform(view.top, view.bottom),
+                              game.ticks)
+
+
+def run_scenario(enemies=0, coins=0, bullet_count=1, backend="objects", parallel=False,
+                 ticks=120, seed=0):
+    """run the game headlessly with fixed entity counts and return the median ms per stage."""
+    from game import Game
+    from inputs import TickInput
+
+    game = Game(enemy_backend=backend, headless=True, seed=seed, parallel=parallel)
+    # the benchmark controls the population itself, and the player can't die
+    game.director.max_enemies = 0
+    game.player.health = UNDYING_HEALTH
+    game.player.bullet_count = bullet_count
+
+    inputs = TickInput(shoot_nearest=bullet_count > 1)
+    samples = {stage: [] for stage in STAGES}
+    for _ in range(ticks):
+        top_up(game, enemies, coins)
+        game.profiler.begin_frame()
+
+        start = time.perf_counter_ns()
+        game.step(inputs)
+        middle = time.perf_counter_ns()
+        game.draw()
+        end = time.perf_counter_ns()
+
+        game.profiler.end_frame()
+        timings = game.profiler.current
+        timings["update"] = middle - start
+        timings["draw"] = end - middle
+        for stage in STAGES:
+            samples[stage].append(timings.get(stage, 0))
+
+    return {stage: float(np.median(values)) / 1e6 for stage, values in samples.items()}
+
+
+def compare(results, baseline, tolerance):
+    """print stages that got slower than the baseline by more than `tolerance`.
+
+    returns True if any regression was found.
+    """
+    regressed = False
+    for scenario, stages in results.items():
+        for stage, ms in stages.items():
+            old = baseline.get(scenario, {}).get(stage)
+            # ignore stages too quick to time reliably
+            if old is None or old < 0.1:
+                continue
+            if ms > old * (1 + tolerance):
+                print(f"REGRESSION {scenario} {stage}: {old:.3f} ms -> {ms:.3f} ms")
+                regressed = True
+    return regressed
+
+
+def bench_scenarios(names, ticks):
+    results = {}
+    print(f"{'scenario':<20}" + "".join(f"{stage[:12]:>13}" for stage in STAGES))
+    for name in names:
+        results[name] = run_scenario(ticks=ticks, **SCENARIOS[name])
+        print(f"{name:<20}" + "".join(f"{results[name][stage]:>13.3f}" for stage in STAGES))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the game at fixed entity counts")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS),
+                        help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--ticks", type=int, default=120, help="ticks to run each scenario for")
+    parser.add_argument("--out", metavar="PATH", help="write the results to a JSON file")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="compare against results saved earlier with --out")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--micro", action="store_true",
+                        help="run the data structure micro-benchmarks instead")
+    parser.add_argument("--network", action="store_true",
+                        help="run the co-op server bandwidth and latency benchmark instead")
+    args = parser.parse_args()
+
+    if args.network:
+        bench_network(ticks=args.ticks)
+        return
+
+    if args.micro:
+        bench_collisions()
+        print()
+        bench_enemy_update()
+        print()
+        bench_separation()
+        print()
+        bench_bullets()
+        return
+
+    results = bench_scenarios(args.scenarios, args.ticks)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+        print("no regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,147 @@
+import numpy as np
+
 import app
-import pygame
-
-class Bullet:
-    def __init__(self, x, y, vx, vy, size):
-        self.x = x
-        self.y = y
-        self.vx = vx
-        self.vy = vy
-        self.size = size
-
-        # create a bullet image with the specified size
-        self.image = app.pygame.Surface((self.size, self.size), app.pygame.SRCALPHA)
-        self.image.fill((255, 255, 255))  # fill with white colour
-        self.rect = self.image.get_rect(center=(self.x, self.y))
-
-    def update(self):
-        # update the bullet's position based on its velocity
-        self.x += self.vx
-        self.y += self.vy
-        self.rect.center = (self.x, self.y)
+from camera import in_view, to_pixels
+
+# one shared bullet image per bullet size, created the first time it's needed
+bullet_images = {}
+
+
+def get_bullet_image(size):
+    """return the cached white square used to draw bullets of the given size."""
+    image = bullet_images.get(size)
+    if image is None:
+        image = app.pygame.Surface((size, size), app.pygame.SRCALPHA)
+        image.fill((255, 255, 255))  # fill with white colour
+        bullet_images[size] = image
+    return image
+
+
+class BulletPool:
+    def __init__(self, capacity=app.BULLET_POOL_CAPACITY):
+        """preallocate room for `capacity` bullets.
+
+        live bullets are packed at the front of the arrays, so the free slots
+        are always the tail and firing just writes into the next free ones.
+        """
+        self.capacity = capacity
+        self.count = 0
+        self.x = np.zeros(capacity, dtype=np.float64)
+        self.y = np.zeros(capacity, dtype=np.float64)
+        self.vx = np.zeros(capacity, dtype=np.float64)
+        self.vy = np.zeros(capacity, dtype=np.float64)
+        self.size = np.zeros(capacity, dtype=np.int32)
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        """remove every bullet."""
+        self.count = 0
+
+    def spawn(self, x, y, vx, vy, size):
+        """fire a volley of bullets from (x, y), one per entry in vx/vy.
+
+        bullets that don't fit in the pool are dropped.
+        """
+        start = self.count
+        end = min(self.capacity, start + len(vx))
+        n = end - start
+        self.x[start:end] = x
+        self.y[start:end] = y
+        self.vx[start:end] = vx[:n]
+        self.vy[start:end] = vy[:n]
+        self.size[start:end] = size
+        self.count = end
+
+    def compact(self, keep):
+        """keep only the bullets where `keep` is true, packing them to the front."""
+        n = self.count
+        kept = int(np.count_nonzero(keep))
+        if kept == n:
+            return
+        for array in (self.x, self.y, self.vx, self.vy, self.size):
+            array[:kept] = array[:n][keep]
+        self.count = kept
+
+    def update(self, view=None):
+        """move every bullet by its velocity and drop the ones that left the view.
+
+        view is the Rect (in world coordinates) shown on screen, by default
+        the top left WIDTH x HEIGHT of the world.
+        """
+        if view is None:
+            view = app.pygame.Rect(0, 0, app.WIDTH, app.HEIGHT)
+        n = self.count
+        x = self.x[:n]
+        y = self.y[:n]
+        x += self.vx[:n]
+        y += self.vy[:n]
+        on_screen = (x >= view.left) & (x <= view.right) & (y >= view.top) & (y <= view.bottom)
+        self.compact(on_screen)
+
+    def remove(self, indices):
+        """remove the bullets at the given indices in one go."""
+        if not indices:
+            return
+        keep = np.ones(self.count, dtype=bool)
+        keep[indices] = False
+        self.compact(keep)
+
+    def rect(self, i):
+        """return the collision rectangle of bullet `i`."""
+        size = int(self.size[i])
+        rect = app.pygame.Rect(0, 0, size, size)
+        rect.center = (self.x[i], self.y[i])
+        return rect
+
+    def bounds(self):
+        """return the left, top, right and bottom of every live bullet's rect.
+
+        the edges match rect(i) (pygame rounds a float centre half away from
+        zero), worked out in bulk so collision tests can skip most bullets.
+        """
+        n = self.count
+        x = self.x[:n]
+        y = self.y[:n]
+        sizes = self.size[:n].astype(np.int64)
+        left = to_pixels(x) - sizes // 2
+        top = to_pixels(y) - sizes // 2
+        return left, top, left + sizes, top + sizes
+
+    def rects(self):
+        """return the collision rectangles of every live bullet, in pool order."""
+        return [self.rect(i) for i in range(self.count)]
+
+    def render_items(self, alpha=1.0, view=None):
+        """return an (image, position) pair for every bullet, for drawing in a batch.
+
+        alpha places each bullet between its previous (0) and current (1) tick
+        position, bullets move in straight lines so that is one velocity back.
+        with a view (a Rect in world coordinates) only the bullets near it are
+        returned, placed relative to its top left.
+        """
+        n = self.count
+        if n == 0:
+            return []
+        sizes = self.size[:n]
+        x = self.x[:n]
+        y = self.y[:n]
+        if alpha != 1.0:
+            x = x - self.vx[:n] * (1.0 - alpha)
+            y = y - self.vy[:n] * (1.0 - alpha)
+        offset_x = offset_y = 0
+        if view is not None:
+            shown = in_view(x, y, view)
+            sizes = sizes[shown]
+            x = x[shown]
+            y = y[shown]
+            offset_x, offset_y = view.topleft
+        # placed on the same pixels as the collision rects, see bounds()
+        left = (to_pixels(x) - sizes // 2 - offset_x).tolist()
+        top = (to_pixels(y) - sizes // 2 - offset_y).tolist()
+        return [(get_bullet_image(s), (l, t)) for s, l, t in zip(sizes.tolist(), left, top)]
 
     def draw(self, surface):
-        # draw the bullet image on the given surface
-        surface.blit(self.image, self.rect)
+        # draw every bullet with the shared image for its size
+        surface.blits(self.render_items(), doreturn=False)
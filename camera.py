@@ -0,0 +1,59 @@
+import numpy as np
+
+import app
+
+
+def to_pixels(values):
+    """round world positions to the whole pixel a Rect centred on them would use.
+
+    pygame rounds half away from zero, unlike np.rint, so this gives the same
+    centres as setting rect.center, for a whole array of positions at once.
+    """
+    return np.trunc(values + np.copysign(0.5, values)).astype(np.int64)
+
+
+def in_view(x, y, view, margin=app.CULL_MARGIN):
+    """return which of the positions (x, y) are close enough to `view` to be drawn.
+
+    works on numbers or numpy arrays alike.
+    """
+    return (
+        (x >= view.left - margin) & (x <= view.right + margin)
+        & (y >= view.top - margin) & (y <= view.bottom + margin)
+    )
+
+
+class Camera:
+    def __init__(self, width=app.WIDTH, height=app.HEIGHT,
+                 world_width=app.WORLD_WIDTH, world_height=app.WORLD_HEIGHT):
+        """the part of the world shown on screen, following a point around.
+
+        the view never leaves the world, so at the world's edges the point
+        being followed drifts away from the middle of the screen.
+        """
+        self.width = width
+        self.height = height
+        self.world_width = world_width
+        self.world_height = world_height
+        # the visible area in world coordinates
+        self.view = app.pygame.Rect(0, 0, width, height)
+
+    def view_at(self, x, y):
+        """return the visible area centred on world position (x, y)."""
+        left = min(max(round(x) - self.width // 2, 0), max(0, self.world_width - self.width))
+        top = min(max(round(y) - self.height // 2, 0), max(0, self.world_height - self.height))
+        return app.pygame.Rect(left, top, self.width, self.height)
+
+    def follow(self, x, y):
+        """move the view to be centred on (x, y)."""
+        self.view = self.view_at(x, y)
+
+    def to_world(self, pos, view=None):
+        """convert a position on screen (like the mouse) to world coordinates.
+
+        view is the visible area the screen was drawn with, the camera's
+        current one by default.
+        """
+        if view is None:
+            view = self.view
+        return (pos[0] + view.x, pos[1] + view.y)
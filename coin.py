@@ -1,20 +1,29 @@
 import app
 
-class Coin:
-    def __init__(self, x, y):
-        # initialising the coin's position with the given x, y coordinates
-        self.x = x
-        self.y = y
-        
-        # creating a transparent surface for the coin image with a size of 15x15 pixels
-        self.image = app.pygame.Surface((15, 15), app.pygame.SRCALPHA)
-        
-        # filling the surface with a golden colour (rgb: 255, 215, 0)
-        self.image.fill((255, 215, 0))
-        
-        # creating a rectangle for positioning the coin on screen, centred at (x, y)
-        self.rect = self.image.get_rect(center=(self.x, self.y))
+# one shared image per coin stack size, created the first time it's needed
+coin_images = {}
+
+
+def coin_size(value):
+    """return the width and height of a coin stack worth `value` xp.
+
+    bigger stacks are drawn a little bigger, up to four sizes.
+    """
+    tier = 0
+    while tier < 3 and value >= app.COIN_STACK_TIERS[tier]:
+        tier += 1
+    return 15 + 3 * tier
 
-    def draw(self, surface):
-        # drawing the coin's image on the given surface (typically the screen)
-        surface.blit(self.image, self.rect)
\ No newline at end of file
+
+def get_coin_image(value):
+    """return the cached image for a coin stack worth `value` xp."""
+    size = coin_size(value)
+    image = coin_images.get(size)
+    if image is None:
+        # creating a transparent surface for the coin image
+        image = app.pygame.Surface((size, size), app.pygame.SRCALPHA)
+
+        # filling the surface with a golden colour (rgb: 255, 215, 0)
+        image.fill((255, 215, 0))
+        coin_images[size] = image
+    return image
@@ -1,26 +1,88 @@
-import pygame
 import app
 import math
+import numpy as np
+
+
+def knockback_pushes(x, y, px, py, radius=app.KNOCKBACK_RADIUS,
+                     falloff=app.KNOCKBACK_FALLOFF):
+    """work out the knockback for enemies at (x, y) when the player at (px, py) is hit.
+
+    returns (hit, dir_x, dir_y, dist) arrays: which enemies are pushed, the
+    unit direction away from the player and how far, for the pushed ones.
+    """
+    dx = x - px
+    dy = y - py
+    length = np.sqrt(dx * dx + dy * dy)
+    # an enemy right on top of the player has no direction to go in
+    hit = length != 0
+    if radius is not None:
+        hit &= length < radius
+    length = length[hit]
+    if radius is None:
+        dist = np.full(len(length), float(app.PUSHBACK_DISTANCE))
+    else:
+        dist = app.PUSHBACK_DISTANCE * (1 - length / radius) ** falloff
+    return hit, dx[hit] / length, dy[hit] / length, dist
+
+def nearest_players(x, y, players):
+    """return the index into `players` of the one nearest to each enemy at (x, y)."""
+    px = np.array([player.x for player in players], dtype=np.float64)
+    py = np.array([player.y for player in players], dtype=np.float64)
+    dx = x[:, None] - px
+    dy = y[:, None] - py
+    return np.argmin(dx * dx + dy * dy, axis=1)
 
 class Enemy:
-    def __init__(self, x, y, enemy_type, enemy_assets, speed=app.DEFAULT_ENEMY_SPEED):
+    # enemies are created by the thousand, so they get fixed attributes instead
+    # of a __dict__ each
+    __slots__ = (
+        "enemy_assets", "flipped_assets", "index", "x", "y", "prev_x", "prev_y", "speed",
+        "frames", "flipped_frames", "frame_index", "animation_timer", "animation_speed",
+        "image", "rect", "enemy_type", "type_index", "facing_left", "knockback_dist_remaining",
+        "knockback_dx", "knockback_dy",
+    )
+
+    def __init__(self, x, y, enemy_type, enemy_assets, speed=app.DEFAULT_ENEMY_SPEED,
+                 flipped_assets=None):
+        # the animation frames of every enemy type, kept so the enemy can be
+        # reset as a different type when it is reused from a pool
+        self.enemy_assets = enemy_assets
+        # left-facing frames, normally shared from app.load_assets()
+        self.flipped_assets = flipped_assets
+        # position in the game's enemy list, so it can be removed without a search
+        self.index = -1
+        # created here and reused, so resetting or animating doesn't allocate
+        self.rect = app.pygame.Rect(0, 0, 0, 0)
+        self.reset(x, y, enemy_type, speed)
+
+    def reset(self, x, y, enemy_type, speed=app.DEFAULT_ENEMY_SPEED):
+        """put the enemy back in its just-spawned state at (x, y)."""
         # define the x and y position of the enemy
         self.x = x
         self.y = y
+        # the position at the start of the tick, for drawing between ticks
+        self.prev_x = x
+        self.prev_y = y
 
         # define the speed at which the enemy moves
         self.speed = speed
 
         # load the animation frames for the enemy
-        self.frames = enemy_assets[enemy_type]
+        self.frames = self.enemy_assets[enemy_type]
+        if self.flipped_assets is not None:
+            self.flipped_frames = self.flipped_assets[enemy_type]
+        else:
+            self.flipped_frames = app.flip_frames(self.frames)
         self.frame_index = 0
         self.animation_timer = 0
         self.animation_speed = 8
         self.image = self.frames[self.frame_index]
-        self.rect = self.image.get_rect(center=(self.x, self.y))
+        self.rect.size = self.image.get_size()
+        self.rect.center = (self.x, self.y)
 
-        # define the enemy type
+        # define the enemy type, and its position among the types (as EnemyHorde stores it)
         self.enemy_type = enemy_type
+        self.type_index = list(self.enemy_assets).index(enemy_type)
 
         # track if the enemy is facing left
         self.facing_left = False
@@ -30,23 +92,63 @@ class Enemy:
         self.knockback_dx = 0
         self.knockback_dy = 0
 
-    def update(self, player):
+    def load(self, state, enemy_type):
+        """take on a saved state, a tuple in the order of horde.FIELDS.
+
+        enemy_type is the name of the type at state's type_index.
+        """
+        (self.x, self.y, self.prev_x, self.prev_y, self.speed, self.knockback_dx,
+         self.knockback_dy, self.knockback_dist_remaining, self.facing_left, self.type_index,
+         self.frame_index, self.animation_timer) = state
+        if enemy_type != self.enemy_type:
+            self.enemy_type = enemy_type
+            self.frames = self.enemy_assets[enemy_type]
+            if self.flipped_assets is not None:
+                self.flipped_frames = self.flipped_assets[enemy_type]
+            else:
+                self.flipped_frames = app.flip_frames(self.frames)
+        self.image = self.frames[self.frame_index]
+        self.rect.size = self.image.get_size()
+        self.rect.center = (self.x, self.y)
+
+    def update(self, player, separation=(0.0, 0.0)):
+        # remember where this tick started
+        self.prev_x = self.x
+        self.prev_y = self.y
+
         # check if knockback is active and apply knockback if so
         if self.knockback_dist_remaining > 0:
             self.apply_knockback()
         else:
-            self.move_toward_player(player)  # if no knockback, move towards the player
+            # if no knockback, move towards the player
+            self.move_toward_player(player, separation)
 
         # update the enemy's sprite animation
         self.animate()
 
-    def move_toward_player(self, player):
+    def move_toward_player(self, player, separation=(0.0, 0.0)):
         # calculate the direction vector towards the player
         dx = player.x - self.x
         dy = player.y - self.y
-        dist = (dx**2 + dy**2) ** 0.5
-
-        if dist != 0:
+        # the same operations in the same order as EnemyHorde.update, so both
+        # backends round the same way and stay bit-for-bit identical
+        dist = math.sqrt(dx * dx + dy * dy)
+
+        sep_x, sep_y = separation
+        if sep_x or sep_y:
+            # blend in the push away from nearby enemies (see flocking.py),
+            # never going faster than the enemy's speed
+            steer_x = dx / dist if dist != 0 else 0.0
+            steer_y = dy / dist if dist != 0 else 0.0
+            steer_x += sep_x * app.SEPARATION_WEIGHT
+            steer_y += sep_y * app.SEPARATION_WEIGHT
+            length = math.sqrt(steer_x * steer_x + steer_y * steer_y)
+            if length > 1:
+                steer_x /= length
+                steer_y /= length
+            self.x += steer_x * self.speed
+            self.y += steer_y * self.speed
+        elif dist != 0:
             self.x += (dx / dist) * self.speed
             self.y += (dy / dist) * self.speed
 
@@ -83,27 +185,23 @@ class Enemy:
             self.frame_index = (self.frame_index + 1) % len(self.frames)
             center = self.rect.center
             self.image = self.frames[self.frame_index]
-            self.rect = self.image.get_rect()
+            self.rect.size = self.image.get_size()
             self.rect.center = center
         pass
 
-    def draw(self, surface):
-        # flip the sprite if facing left
+    def render_item(self, alpha=1.0):
+        # the (image, position) pair used to draw the enemy in a batch
+        # alpha places it between its previous (0) and current (1) tick position
+        # use the pre-flipped frame if facing left
         if self.facing_left:
-            flipped_image = pygame.transform.flip(self.image, True, False)
-            surface.blit(flipped_image, self.rect)
+            image = self.flipped_frames[self.frame_index]
         else:
-            surface.blit(self.image, self.rect)
-
-        # draw the enemy sprite on the given surface
-
-    def set_knockback(self, px, py, dist):
-        # calculate the knockback direction based on the player position
-        dx = self.x - px
-        dy = self.y - py
-        length = math.sqrt(dx * dx + dy * dy)
-        if length != 0:
-            self.knockback_dx = dx / length
-            self.knockback_dy = dy / length
-            self.knockback_dist_remaining = dist
-        pass
\ No newline at end of file
+            image = self.image
+        if alpha == 1.0:
+            return image, self.rect
+        x = self.prev_x + (self.x - self.prev_x) * alpha
+        y = self.prev_y + (self.y - self.prev_y) * alpha
+        return image, image.get_rect(center=(x, y))
+
+    def draw(self, surface):
+        surface.blit(*self.render_item())
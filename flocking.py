@@ -0,0 +1,105 @@
+import numpy as np
+
+import app
+
+# the cell and its eight neighbours
+NEIGHBOUR_OFFSETS = [(ox, oy) for ox in (-1, 0, 1) for oy in (-1, 0, 1)]
+
+
+def separation_cells(x, y, radius=app.SEPARATION_RADIUS):
+    """bucket every enemy into square cells `radius` wide for separation_forces().
+
+    returns (cell_x, cell_y, columns, rows, order, cell_starts): each enemy's
+    cell, the size of the grid, the enemies sorted by cell, and where each
+    cell's run starts in that order. it only reads the positions, so one
+    bucketing can be shared by every chunk of a parallel update.
+    """
+    # number the cells so each one is a single integer, row by row
+    cell_x = np.floor(x / radius).astype(np.int64)
+    cell_y = np.floor(y / radius).astype(np.int64)
+    cell_x -= cell_x.min()
+    cell_y -= cell_y.min()
+    columns = int(cell_x.max()) + 1
+    rows = int(cell_y.max()) + 1
+    cell_ids = cell_x * rows + cell_y
+
+    # enemies sorted by cell, so each cell's enemies are one contiguous run,
+    # with cell_starts[c] to cell_starts[c + 1] being cell c's run
+    order = np.argsort(cell_ids, kind="stable")
+    cell_starts = np.zeros(columns * rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cell_ids, minlength=columns * rows), out=cell_starts[1:])
+    return cell_x, cell_y, columns, rows, order, cell_starts
+
+
+def separation_forces(x, y, radius=app.SEPARATION_RADIUS, start=0, end=None,
+                      max_neighbours=app.SEPARATION_MAX_NEIGHBOURS, cells=None):
+    """return how strongly enemies start..end are pushed away from their neighbours.
+
+    x and y hold every enemy's position. each enemy is pushed directly away
+    from every other enemy closer than `radius`, harder the closer it is, and
+    the pushes are summed into one (x array, y array) pair. enemies are
+    bucketed into cells `radius` wide so only the 3x3 cells around each
+    enemy are searched. only the first `max_neighbours` enemies of a crowded
+    cell are looked at, each standing in for its share of the cell, so the
+    cost stays linear however tightly the enemies bunch up. `cells` is the
+    bucketing from separation_cells(), worked out here if it isn't given.
+    """
+    end = len(x) if end is None else end
+    count = end - start
+    force_x = np.zeros(count)
+    force_y = np.zeros(count)
+    if count == 0 or len(x) < 2 or radius <= 0:
+        return force_x, force_y
+
+    if cells is None:
+        cells = separation_cells(x, y, radius)
+    cell_x, cell_y, columns, rows, order, cell_starts = cells
+
+    own = np.arange(start, end)
+    own_x = x[start:end]
+    own_y = y[start:end]
+    radius_sq = radius * radius
+    for ox, oy in NEIGHBOUR_OFFSETS:
+        nx = cell_x[start:end] + ox
+        ny = cell_y[start:end] + oy
+        inside = (nx >= 0) & (nx < columns) & (ny >= 0) & (ny < rows)
+        target = np.where(inside, nx * rows + ny, 0)
+        first = cell_starts[target]
+        sizes = np.where(inside, cell_starts[target + 1] - first, 0)
+        taken = np.minimum(sizes, max_neighbours)
+        total = int(taken.sum())
+        if total == 0:
+            continue
+
+        # one (i, j) pair per enemy and each enemy looked at in that
+        # neighbouring cell, scaled by how many enemies each one stands for
+        pair_i = np.repeat(np.arange(count), taken)
+        run_start = np.repeat(first - (np.cumsum(taken) - taken), taken)
+        pair_j = order[run_start + np.arange(total)]
+        share = np.repeat(sizes / np.maximum(taken, 1), taken)
+
+        dx = own_x[pair_i] - x[pair_j]
+        dy = own_y[pair_i] - y[pair_j]
+        dist_sq = dx * dx + dy * dy
+        close = (dist_sq < radius_sq) & (own[pair_i] != pair_j)
+        if not close.any():
+            continue
+        pair_i = pair_i[close]
+        share = share[close]
+        dx = dx[close]
+        dy = dy[close]
+        dist = np.sqrt(dist_sq[close])
+
+        # enemies in exactly the same spot are split apart sideways, the
+        # later one in the arrays going right
+        stacked = dist == 0
+        if stacked.any():
+            dx[stacked] = np.where(own[pair_i[stacked]] > pair_j[close][stacked], 1.0, -1.0)
+            dist[stacked] = 1.0
+
+        # full strength when touching, fading to nothing at the radius
+        weight = (radius - dist) / (radius * dist) * share
+        force_x += np.bincount(pair_i, weights=dx * weight, minlength=count)
+        force_y += np.bincount(pair_i, weights=dy * weight, minlength=count)
+
+    return force_x, force_y
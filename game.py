@@ -1,19 +1,74 @@
 # FINAL SUBMISSION OF MY AT1 ASSESSMENT
 
-import math
+import numpy as np
 import pygame
 import random
 import os
+import struct
+import time
+import zlib
 
 import app
-from coin import Coin
-from enemy import Enemy
+from asset_manager import AssetManager
+from audio import AudioBus
+from camera import Camera
+from enemy import Enemy, knockback_pushes, nearest_players
+from flocking import separation_forces
+from horde import FIELDS, EnemyHorde
+from inputs import InputMapper, TickInput
 from player import Player
-from powerup import Powerup
+from pickups import PickupField
+from powerup import POWERUP_TYPES
+from parallel import ChunkPool
+from pool import ObjectPool
+from profiler import FrameProfiler
+from renderer import DirtyRectRenderer, RenderQueue
+from text_cache import GlyphAtlas, TextCache
+from replay import InputRecorder
+from snapshot import SnapshotRing
+from spatial import SpatialGrid, overlapping_pairs
+from waves import WaveDirector
+from world import TileWorld
 
 class Game:
-    def __init__(self):
-        """initialise the game, set up screen, clock, and assets."""
+    def __init__(self, enemy_backend=app.ENEMY_BACKEND, headless=False, seed=None,
+                 profile=False, parallel=app.PARALLEL_UPDATE):
+        """initialise the game, set up screen, clock, and assets.
+
+        a headless game uses SDL's dummy video and audio drivers, so nothing is
+        shown or heard, and is driven one tick at a time with step().
+        with parallel=True the numpy enemy backend updates in chunks on a
+        thread pool, giving exactly the same results as the serial update.
+        """
+        # used to measure how long it takes to get the first frame on screen
+        self.start_time = time.perf_counter()
+        self.time_to_first_frame = None
+
+        self.headless = headless
+        if headless:
+            # these must be set before pygame.init() to take effect
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+        # every random choice the game makes comes from this generator, so the
+        # same seed and inputs always play out the same way. seeds are kept to
+        # 64 unsigned bits, the size saved in replays and snapshots
+        if seed is None:
+            seed = random.randrange(2**63)
+        self.seed = seed & (2**64 - 1)
+        self.rng = random.Random(self.seed)
+
+        # set with start_recording() to log every tick's input to a replay file
+        self.recorder = None
+
+        # turns key presses and mouse clicks into actions, see app.KEY_BINDINGS
+        self.input_mapper = InputMapper()
+
+        # times each stage of update() and draw(), F3 shows the results on screen
+        # with profile=True every frame is kept so it can be exported afterwards
+        self.profiler = FrameProfiler(keep_all=profile)
+        self.show_profiler = False
+
         pygame.init()
         # set up the game window with the specified width and height from app settings
         self.screen = pygame.display.set_mode((app.WIDTH, app.HEIGHT))
@@ -22,327 +77,819 @@ class Game:
         # create a clock to manage the game's frame rate
         self.clock = pygame.time.Clock()
 
+        # images and sounds are decoded on worker threads, scaled images are
+        # cached on disk, and things only needed later load on first use
+        self.asset_manager = AssetManager()
+
+        # sound effects are queued during each tick and played together at the
+        # end of it, headless games don't load or play any
+        self.audio = AudioBus(self.asset_manager, null=headless)
+
+        # start decoding the sound effects so they load alongside the images
+        # the death sound is only needed at the end of a game so it loads lazily
+        self.audio.load("coin_collection", "assets/sfx/coin_collection.wav")
+        self.audio.load("powerup_collection", "assets/sfx/powerup_collection.wav")
+        self.audio.load("enemy_death", "assets/sfx/enemy_death.wav")
+        self.audio.load("player_death", "assets/sfx/player_death.mp3", lazy=True)
+        self.audio.load("menu_click", "assets/sfx/menu_click.wav")
+        self.audio.load("player_damaged", "assets/sfx/player_damaged.wav")
+
         # load the game assets (images, sounds, etc.)
-        self.assets = app.load_assets()
+        self.assets = app.load_assets(self.asset_manager)
 
         # set up fonts for text rendering
+        # the large font is only used on the game over screen
         font_path = os.path.join("assets", "PressStart2P.ttf")
-        self.font_small = pygame.font.Font(font_path, 18)
-        self.font_large = pygame.font.Font(font_path, 32)
-
-        # create a random background using the floor tiles from the assets
-        self.background = self.create_random_background(
-            app.WIDTH, app.HEIGHT, self.assets["floor_tiles"]
-        )
+        self.font_small = self.asset_manager.font(font_path, 18)
+        self.font_large = self.asset_manager.font(font_path, 32, lazy=True)
+        self.font_tiny = self.asset_manager.font(font_path, 8, lazy=True)
+
+        # rendered text is cached, and the HUD numbers are built from glyphs
+        self.text_cache = TextCache()
+        self.hud_glyphs = GlyphAtlas(self.font_small, (255, 255, 255))
+
+        # the game over overlay never changes, so it is only created once
+        self.game_over_overlay = pygame.Surface((app.WIDTH, app.HEIGHT), pygame.SRCALPHA)
+        self.game_over_overlay.fill((0, 0, 0, 180))
+
+        # the floor of the whole world, made of random floor tiles and drawn
+        # in chunks as they come into view
+        self.world = TileWorld(self.assets["floor_tiles"], self.rng.getrandbits(32))
+        # the screen follows the player around the world
+        self.camera = Camera()
+
+        # the floor under the camera, redrawn whenever the camera moves
+        self.background = pygame.Surface((app.WIDTH, app.HEIGHT))
+        self.background_view = None
+        # the view the last frame was drawn with, between ticks this is not
+        # the camera's, so clicks on that frame are placed in the world with it
+        self.drawn_view = None
+
+        # everything is drawn through the renderer so it can track what changed
+        self.renderer = DirtyRectRenderer(self.screen, self.background)
+        # sprites are queued during draw() and blitted together in one call
+        self.render_queue = RenderQueue()
+
+        # everyone playing, the first player being the one on this machine.
+        # co-op players are added with add_player()
+        self.players = []
 
         # initial game state: running and not over
         self.running = True
         self.game_over = False
 
-        # initialise coins and powerups lists
-        self.coins = []
+        # number of logic ticks since the game was last reset
+        self.ticks = 0
+
+        # coins and powerups on the floor, capped in number and expiring over time
+        self.pickups = PickupField()
 
         # initialise powerup variables
-        self.powerups = []
         self.powerup_effect = ""
 
-        # initialise sound effects
-        self.coin_collection_sfx = pygame.mixer.Sound("assets/sfx/coin_collection.wav")
-        self.powerup_collection_sfx = pygame.mixer.Sound("assets/sfx/powerup_collection.wav")
-        self.enemy_death_sfx = pygame.mixer.Sound("assets/sfx/enemy_death.wav")
-        self.player_death_sfx = pygame.mixer.Sound("assets/sfx/player_death.mp3")
-        self.menu_click_sfx = pygame.mixer.Sound("assets/sfx/menu_click.wav")
-        self.player_damaged_sfx = pygame.mixer.Sound("assets/sfx/player_damaged.wav")
+        # spatial index of the enemies used by the collision checks
+        # enemies move so the grid is rebuilt every tick
+        self.enemy_grid = SpatialGrid()
+
+        # initialise enemies, with room for the first ones made up front
+        if enemy_backend not in ("objects", "numpy"):
+            raise ValueError(f"unknown enemy backend: {enemy_backend!r}")
+        self.enemy_backend = enemy_backend
+        self.enemy_pool = ObjectPool(lambda x, y, enemy_type: Enemy(
+            x, y, enemy_type, self.assets["enemies"],
+            flipped_assets=self.assets["enemies_flipped"],
+        ))
+        self.enemies = self.create_enemy_store()
+        # only the numpy backend's batched work can be split between threads
+        self.update_pool = ChunkPool() if parallel and enemy_backend == "numpy" else None
+
+        # decides when and what enemies spawn
+        self.director = WaveDirector(self.assets["enemies"].keys())
 
-        # initialise enemies and enemy spawn timer
-        self.enemies = []
-        self.enemy_spawn_timer = 0
-        self.enemy_spawn_interval = 60
-        self.enemies_per_spawn = 1
+        # recent snapshots of the whole game, for rewinding and crash dumps
+        self.snapshots = SnapshotRing()
 
         # reset the game to its starting state
         self.reset_game()
 
     def reset_game(self):
         """reset the game to its initial state."""
-        # create a new player at the centre of the screen
-        self.player = Player(app.WIDTH // 2, app.HEIGHT // 2, self.assets)
+        # create new players at the centre of the world, as many as there were,
+        # the first one staying a spectator if it was one
+        spectator = bool(self.players) and self.player.spectator
+        self.players = [
+            Player(app.WORLD_WIDTH // 2, app.WORLD_HEIGHT // 2, self.assets)
+            for _ in range(max(1, len(self.players)))
+        ]
+        self.player = self.players[0]
+        self.player.spectator = spectator
+        self.camera.follow(self.player.x, self.player.y)
 
         # reset coins, powerups, and enemies
-        self.coins = []
-        self.powerups = []
-        self.enemies = []
-        self.enemy_spawn_timer = 0
-        self.enemies_per_spawn = 1
+        self.pickups.clear()
+        self.clear_enemies()
+        self.director.reset()
+        self.enemy_grid.clear()
 
         # set the game over flag to false
         self.game_over = False
+        self.ticks = 0
+        self.snapshots.clear()
+
+        # the game over screen covered everything, so redraw it all
+        self.renderer.invalidate()
 
         # stop the player death sound when restarting the game
-        self.player_death_sfx.stop()
+        self.audio.stop("player_death")
 
         # play a menu click sound when restarting the game
-        self.menu_click_sfx.play()
-
-    def create_random_background(self, width, height, floor_tiles):
-        """create a random background using floor tiles."""
-        bg = pygame.Surface((width, height))
-        tile_w = floor_tiles[0].get_width()
-        tile_h = floor_tiles[0].get_height()
+        self.audio.play("menu_click")
+
+    def add_player(self):
+        """add a co-op player at the centre of the world and return it."""
+        player = Player(app.WORLD_WIDTH // 2, app.WORLD_HEIGHT // 2, self.assets)
+        self.players.append(player)
+        return player
+
+    def remove_player(self, player):
+        """take a co-op player out of the game, the first player always stays."""
+        if player is not self.player:
+            self.players.remove(player)
+
+    def playing_players(self):
+        """return the players taking part in the game, leaving out spectators."""
+        return [player for player in self.players if not player.spectator]
+
+    def live_players(self):
+        """return the players taking part that still have health left."""
+        return [player for player in self.players if player.health > 0 and not player.spectator]
+
+    def create_enemy_store(self):
+        """return an empty container for enemies using the selected backend."""
+        if self.enemy_backend == "numpy":
+            horde = EnemyHorde(self.assets["enemies"], self.assets["enemies_flipped"])
+            horde.prewarm(app.ENEMY_POOL_PREWARM)
+            return horde
+        self.enemy_pool.prewarm(app.ENEMY_POOL_PREWARM, 0, 0, next(iter(self.assets["enemies"])))
+        return []
+
+    def clear_enemies(self):
+        """remove every enemy, keeping them around to be reused."""
+        if self.enemy_backend == "numpy":
+            self.enemies.clear()
+        else:
+            for enemy in self.enemies:
+                self.enemy_pool.release(enemy)
+            self.enemies.clear()
 
-        # tile the background using random floor tiles
-        for y in range(0, height, tile_h):
-            for x in range(0, width, tile_w):
-                tile = random.choice(floor_tiles)
-                bg.blit(tile, (x, y))
+    def load_enemies(self, count, arrays):
+        """replace every enemy with `count` enemies read from arrays (see horde.FIELDS)."""
+        if self.enemy_backend == "numpy":
+            self.enemies.load_arrays(count, arrays)
+            return
 
-        return bg
+        # reuse the enemies already in the list, only topping it up from the
+        # pool or handing the spare ones back
+        enemies = self.enemies
+        while len(enemies) > count:
+            self.enemy_pool.release(enemies.pop())
+        first_type = next(iter(self.assets["enemies"]))
+        while len(enemies) < count:
+            enemies.append(self.enemy_pool.acquire(0, 0, first_type))
+
+        types = list(self.assets["enemies"])
+        names = [types[t] for t in arrays["type_index"][:count].tolist()]
+        states = zip(*(arrays[name][:count].tolist() for name in FIELDS))
+        for i, (enemy, state, enemy_type) in enumerate(zip(enemies, states, names)):
+            enemy.load(state, enemy_type)
+            enemy.index = i
+
+    def spawn_enemy(self, x, y, enemy_type):
+        """add a single enemy of the given type at (x, y)."""
+        if self.enemy_backend == "numpy":
+            enemy = self.enemies.spawn(x, y, enemy_type)
+        else:
+            enemy = self.enemy_pool.acquire(x, y, enemy_type)
+            enemy.index = len(self.enemies)
+            self.enemies.append(enemy)
+        self.enemy_grid.insert(enemy)
+
+    def remove_enemy(self, enemy):
+        """take a dead enemy out of the game.
+
+        the last enemy is moved into its place, the same as EnemyHorde.remove()
+        does, so both backends keep their enemies in the same order.
+        """
+        self.enemy_grid.remove(enemy)
+        if self.enemy_backend == "numpy":
+            self.enemies.remove(enemy)
+            return
 
-    def run(self):
-        """run the game loop."""
-        while self.running:
-            # set the frame rate for the game
-            self.clock.tick(app.FPS)
-            # handle events like key presses or window closing
-            self.handle_events()
+        enemies = self.enemies
+        last = enemies.pop()
+        if last is not enemy:
+            enemies[enemy.index] = last
+            last.index = enemy.index
+        enemy.index = -1
+        self.enemy_pool.release(enemy)
+
+    def update_enemies(self):
+        """move and animate every enemy, steering them apart from each other.
+
+        each enemy chases whichever live player is nearest to it.
+        """
+        separate = app.SEPARATION_RADIUS > 0 and len(self.enemies) > 1
+        # once everyone is dead the enemies close in on where they fell
+        players = self.live_players() or self.playing_players() or self.players
+        if self.enemy_backend == "numpy":
+            horde = self.enemies
+            if self.update_pool:
+                # every push is worked out before anyone moves
+                separation = None
+                if separate:
+                    # bucket the enemies once here, the threads only split the pair work
+                    cells = horde.separation_cells()
+                    chunks = self.update_pool.map(
+                        lambda start, end: horde.separation(start, end, cells), len(horde))
+                    separation = (np.concatenate([chunk[0] for chunk in chunks]),
+                                  np.concatenate([chunk[1] for chunk in chunks]))
+
+                def update_chunk(start, end):
+                    chunk_separation = None
+                    if separation is not None:
+                        chunk_separation = (separation[0][start:end], separation[1][start:end])
+                    horde.update(players, start, end, chunk_separation)
+
+                self.update_pool.map(update_chunk, len(horde))
+            else:
+                horde.update(players, separation=horde.separation() if separate else None)
+            return
 
-            if not self.game_over:
-                # update game state if the game is not over
-                self.update()
+        n = len(self.enemies)
+        if separate or len(players) > 1:
+            x = np.fromiter((enemy.x for enemy in self.enemies), dtype=np.float64, count=n)
+            y = np.fromiter((enemy.y for enemy in self.enemies), dtype=np.float64, count=n)
+        if len(players) > 1:
+            chased = [players[i] for i in nearest_players(x, y, players).tolist()]
+        else:
+            chased = [players[0]] * n
+        if separate:
+            push_x, push_y = separation_forces(x, y)
+            for enemy, player, sep in zip(self.enemies, chased,
+                                          zip(push_x.tolist(), push_y.tolist())):
+                enemy.update(player, sep)
+        else:
+            for enemy, player in zip(self.enemies, chased):
+                enemy.update(player)
 
-            # draw everything on the screen
-            self.draw()
+    def run(self):
+        """run the game loop.
+
+        the logic runs in fixed ticks of 1 / TICK_RATE seconds, as many per frame
+        as real time has passed, while frames are drawn as often as
+        MAX_RENDER_FPS allows with sprites placed between their last two ticks.
+        when drawing can't keep up, frames are dropped rather than ticks, and
+        the wave director spawns fewer enemies until it catches up.
+        """
+        tick_length = 1.0 / app.TICK_RATE
+        # real time that has passed but not been simulated yet
+        lag = 0.0
+        last_time = time.perf_counter()
+
+        try:
+            while self.running:
+                # cap the frame rate for drawing
+                self.clock.tick(app.MAX_RENDER_FPS)
+                now = time.perf_counter()
+                lag += now - last_time
+                last_time = now
+                self.profiler.begin_frame()
+
+                # handle events like key presses or window closing. actions for
+                # the game wait in the input buffer until a tick is due
+                with self.profiler.section("events"):
+                    self.handle_events()
+
+                # advance the game by as many ticks as are due
+                ticks_run = 0
+                while lag >= tick_length and ticks_run < app.MAX_TICKS_PER_FRAME:
+                    if ticks_run == 0:
+                        # read the held keys right before the tick that uses them
+                        inputs = self.input_mapper.sample()
+                    self.step(inputs)
+                    if self.recorder:
+                        self.recorder.record(inputs)
+                    lag -= tick_length
+                    ticks_run += 1
+                    # one-off actions only happen on the first tick
+                    inputs = inputs.held()
+
+                # too far behind to catch up, so skip the missed ticks
+                if lag >= tick_length:
+                    lag %= tick_length
+
+                # draw everything on the screen, part way to the next tick
+                self.draw(1.0 if self.game_over else lag / tick_length)
+                # time from reading the input to the frame showing its result
+                latency = self.input_mapper.latency() if ticks_run else None
+                if latency is not None:
+                    self.profiler.record("input latency", latency)
+                self.profiler.end_frame()
+
+                # spawn fewer enemies while frames are running slow. a recording
+                # must replay the same on any machine, so it always spawns the lot
+                if not self.recorder:
+                    self.director.report_frame_time(time.perf_counter() - now)
+        except Exception:
+            # keep the last snapshot so the crash can be loaded with --restore
+            if self.snapshots.dump(app.CRASH_DUMP_PATH):
+                print(f"saved the last snapshot to {app.CRASH_DUMP_PATH}")
+            raise
+
+        # finish writing the replay file, if one is being recorded
+        self.stop_recording()
+
+        # stop the update threads, if there are any
+        if self.update_pool:
+            self.update_pool.shutdown()
 
         # quit pygame when the game loop ends
         pygame.quit()
 
+    def run_headless(self, ticks, input_source=None):
+        """run `ticks` logic ticks as fast as possible without drawing anything.
+
+        input_source is called with the tick number and returns that tick's
+        TickInput, when it is None the player does nothing.
+        """
+        for _ in range(ticks):
+            if self.game_over:
+                break
+            inputs = input_source(self.ticks) if input_source else TickInput()
+            if self.recorder:
+                self.recorder.record(inputs)
+            self.profiler.begin_frame()
+            self.step(inputs)
+            self.profiler.end_frame()
+
+    def start_recording(self, path):
+        """record every tick's input from now on to a replay file at `path`."""
+        self.recorder = InputRecorder(path, self.seed, self.enemy_backend)
+
+    def stop_recording(self):
+        """finish the replay file being recorded, if there is one."""
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+
+    def step(self, inputs, co_op_inputs=()):
+        """advance the game by exactly one logic tick using the given TickInput.
+
+        co_op_inputs holds a TickInput for each co-op player (self.players[1:]),
+        any left out do nothing this tick.
+        """
+        # restart the game if asked to (only possible from the game over screen),
+        # co-op players can ask too, so a server with no one at its keyboard
+        # can still be restarted
+        if inputs.reset or (self.game_over and any(i.reset for i in co_op_inputs)):
+            self.reset_game()
+
+        if not self.game_over:
+            all_inputs = self.player_inputs(inputs, co_op_inputs)
+            for player, player_input in all_inputs:
+                # shoot towards the nearest enemies if asked to
+                if player_input.shoot_nearest:
+                    targets = self.find_nearest_enemies(
+                        app.AUTO_AIM_TARGETS, app.AUTO_AIM_RANGE, player)
+                    if targets:
+                        player.shoot_toward_enemies(targets)
+                # shoot towards a position (e.g. the mouse) if asked to
+                if player_input.shoot_at is not None:
+                    player.shoot_toward_mouse(player_input.shoot_at)
+
+            self.update(inputs, co_op_inputs)
+            self.ticks += 1
+            self.snapshots.record(self)
+
+        # play the sounds asked for during the tick, each one once
+        self.audio.flush()
+
+    def player_inputs(self, inputs, co_op_inputs=()):
+        """pair each live player with its TickInput for this tick."""
+        co_op_inputs = list(co_op_inputs)
+        co_op_inputs += [TickInput()] * (len(self.players) - 1 - len(co_op_inputs))
+        return [
+            (player, player_input)
+            for player, player_input in zip(self.players, [inputs] + co_op_inputs)
+            if player.health > 0 and not player.spectator
+        ]
+
     def handle_events(self):
-        """handle player input and game events."""
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
+        """act on the waiting input events, buffering the game's actions for the next tick."""
+        mapper = self.input_mapper
+        for action, position in mapper.poll():
+            if action == "quit":
                 # play a sound when the game window is closed
-                self.menu_click_sfx.play()
+                self.audio.play("menu_click")
                 self.running = False
-            elif event.type == pygame.KEYDOWN:
-                if self.game_over:
-                    # reset the game if the player presses R
-                    if event.key == pygame.K_r:
-                        self.reset_game()
-
-                    # quit the game if the player presses ESC
-                    elif event.key == pygame.K_ESCAPE:
-                        self.menu_click_sfx.play()
-                        self.running = False
-                else:
-                    # shoot towards nearest enemy if spacebar is pressed
-                    if event.key == pygame.K_SPACE:
-                        nearest_enemy = self.find_nearest_enemy()
-                        if nearest_enemy:
-                            self.player.shoot_toward_enemy(nearest_enemy)
-                    # shoot towards mouse position if left mouse button is clicked
-                    elif event.type == pygame.MOUSEBUTTONDOWN:
-                        if event.button == 1:
-                            self.player.shoot_toward_mouse(event.pos)
+            elif action == "toggle_profiler":
+                # toggle the frame timing overlay with F3
+                self.show_profiler = not self.show_profiler
+            elif action == "rewind":
+                # go back a few seconds, even from the game over screen. a
+                # recording can't be rewound as the replay would break
+                if not self.recorder:
+                    self.snapshots.rewind(self, app.REWIND_TICKS)
+            elif self.game_over:
+                # reset the game if the player presses R
+                if action == "reset":
+                    mapper.press(action)
+                # quit the game if the player presses ESC
+                elif action == "back":
+                    self.audio.play("menu_click")
+                    self.running = False
+            elif action == "shoot_nearest":
+                # shoot towards the nearest enemy if spacebar is pressed
+                mapper.press(action)
+            elif action == "shoot_at":
+                # shoot towards the mouse if its button is clicked
+                mapper.press(action, self.camera.to_world(position, self.drawn_view))
+
+    def state_checksum(self):
+        """return a crc32 of the simulation state, used to spot replays drifting apart."""
+        parts = [struct.pack("<qq", self.ticks, self.game_over)]
+        # every player and their bullets, co-op players after the first
+        for player in self.players:
+            bullets = player.bullets
+            n = bullets.count
+            parts += [
+                struct.pack(
+                    "<ddiiidi", player.x, player.y, player.health, player.xp,
+                    player.bullet_count, player.bullet_speed, n,
+                ),
+                bullets.x[:n].tobytes(),
+                bullets.y[:n].tobytes(),
+            ]
+        parts.append(struct.pack("<i", len(self.enemies)))
+        for enemy in self.enemies:
+            parts.append(struct.pack("<ddd", enemy.x, enemy.y, enemy.knockback_dist_remaining))
+        pickups = self.pickups
+        for array in (pickups.x, pickups.y, pickups.value, pickups.expires):
+            parts.append(array[:pickups.count].tobytes())
+        return zlib.crc32(b"".join(parts))
 
     def find_nearest_enemy(self):
         """find the nearest enemy to the player."""
-        if not self.enemies:
-            return None
-        nearest = None
-        min_dist = float('inf')
-        px, py = self.player.x, self.player.y
-
-        # loop through all enemies and find the closest one
-        for enemy in self.enemies:
-            dist = math.sqrt((enemy.x - px)**2 + (enemy.y - py)**2)
-            if dist < min_dist:
-                min_dist = dist
-                nearest = enemy
-        return nearest
-
-    def check_bullet_enemy_collisions(self):
-        """check if any bullets hit enemies."""
-        for bullet in self.player.bullets:
-            for enemy in self.enemies:
-                if bullet.rect.colliderect(enemy.rect):
-                    # remove the bullet if it hits an enemy
-                    self.player.bullets.remove(bullet)
-
-                    # randomly spawn powerups on enemy death
-                    n = random.randint(1, 10)
-                    if n == 2:
-                        powerup_types = ["speed_boost", "speed_up_bullets", "more_bullets"]
-                        powerup_type = random.choice(powerup_types)
-                        self.powerup_effect = powerup_type
+        nearest = self.find_nearest_enemies(1)
+        return nearest[0] if nearest else None
 
-                        # create and add the powerup to the list
-                        powerup = Powerup(enemy.x + 5, enemy.y + 5, powerup_type)
-                        self.powerups.append(powerup)
+    def find_nearest_enemies(self, count, max_range=None, player=None):
+        """find up to `count` enemies closest to a player (the first one by default), nearest first.
 
-                    # play the enemy death sound
-                    self.enemy_death_sfx.play()
+        only enemies within `max_range` pixels are returned, if it is given.
+        """
+        player = player or self.player
+        return self.enemy_grid.nearest(player.x, player.y, count, max_range)
 
-                    # create and add a new coin to the list
-                    new_coin = Coin(enemy.x, enemy.y)
-                    self.coins.append(new_coin)
+    def rebuild_enemy_grid(self):
+        """re-bucket every enemy into the spatial grid from its current rect."""
+        if self.enemy_backend != "numpy":
+            self.enemy_grid.rebuild(self.enemies)
+            return
 
-                    # remove the enemy from the game
-                    self.enemies.remove(enemy)
+        # work out every enemy's cell in bulk instead of building its rect
+        horde = self.enemies
+        size = self.enemy_grid.cell_size
+        if self.update_pool:
+            chunks = self.update_pool.map(
+                lambda start, end: horde.cell_keys(size, start, end), len(horde))
+            key_x = np.concatenate([keys[0] for keys in chunks])
+            key_y = np.concatenate([keys[1] for keys in chunks])
+        else:
+            key_x, key_y = horde.cell_keys(size)
+        self.enemy_grid.rebuild_from_keys(horde.views, key_x, key_y, *horde.max_half_size())
+
+    def enemy_bounds(self):
+        """return the left, top, right and bottom of every enemy's rect as arrays."""
+        if self.enemy_backend == "numpy":
+            return self.enemies.bounds()
+        edges = np.array([(enemy.rect.left, enemy.rect.top, enemy.rect.right, enemy.rect.bottom)
+                          for enemy in self.enemies], dtype=np.int64).reshape(-1, 4)
+        return tuple(edges.T)
+
+    def check_bullet_enemy_collisions(self, player):
+        """check if any of a player's bullets hit enemies."""
+        bullets = player.bullets
+        if not bullets.count:
+            return
+        # pair up the bullets and enemies whose rects overlap in bulk, and count
+        # the enemies still alive under each bullet, so only the bullets
+        # touching one are tested properly
+        enemies = list(self.enemies.views if self.enemy_backend == "numpy" else self.enemies)
+        bullet_ids, enemy_ids = overlapping_pairs(bullets.bounds(), self.enemy_bounds())
+        touching = np.bincount(bullet_ids, minlength=bullets.count)
+        # the pairs of each enemy, to take it off its bullets' counts when it dies
+        by_enemy = np.argsort(enemy_ids, kind="stable")
+        touched, starts, counts = np.unique(enemy_ids[by_enemy], return_index=True, return_counts=True)
+        enemy_pairs = {
+            id(enemies[e]): bullet_ids[by_enemy[start:start + count]]
+            for e, start, count in zip(touched.tolist(), starts.tolist(), counts.tolist())
+        }
+
+        spent_bullets = []
+        for i in np.flatnonzero(touching).tolist():
+            if not touching[i]:
+                continue
+            # only test the enemies sharing a grid cell with the bullet
+            hits = self.enemy_grid.colliding(bullets.rect(i))
+            if not hits:
+                continue
+            enemy = hits[0]
+
+            # a bullet only kills one enemy, and a dead enemy can't be hit again
+            spent_bullets.append(i)
+            self.enemy_grid.remove(enemy)
+            touching[enemy_pairs[id(enemy)]] -= 1
+
+            # randomly spawn powerups on enemy death
+            n = self.rng.randint(1, 10)
+            if n == 2:
+                powerup_type = self.rng.choice(POWERUP_TYPES)
+                self.powerup_effect = powerup_type
+
+                # drop the powerup on the floor
+                self.pickups.add_powerup(enemy.x + 5, enemy.y + 5, powerup_type, self.ticks)
+
+            # play the enemy death sound
+            self.audio.play("enemy_death")
+
+            # drop a coin, which joins any coin stack close by
+            self.pickups.add_coin(enemy.x, enemy.y, self.ticks)
+
+            # remove the enemy from the game
+            self.remove_enemy(enemy)
+
+        # remove the bullets that hit something
+        bullets.remove(spent_bullets)
 
     def spawn_enemies(self):
-        """spawn new enemies at random positions on screen."""
-        self.enemy_spawn_timer += 1
-        if self.enemy_spawn_timer >= self.enemy_spawn_interval:
-            self.enemy_spawn_timer = 0
+        """spawn the enemies the wave director asks for at random positions off screen.
+
+        each wave appears around the screen of one of the live players.
+        """
+        players = self.live_players()
+        if not players:
+            return
+        count = self.director.spawn_count(len(self.enemies))
+        if count:
+            enemy_types = list(self.director.enemy_types)
+            # only draw a random number when there's a choice of player, so a
+            # single player game's spawns don't depend on it
+            target = players[0] if len(players) == 1 else self.rng.choice(players)
+            view = self.camera.view_at(target.x, target.y)
 
             # spawn multiple enemies at random locations
-            for _ in range(self.enemies_per_spawn):
-                side = random.choice(["top", "bottom", "left", "right"])
+            for _ in range(count):
+                side = self.rng.choice(["top", "bottom", "left", "right"])
                 if side == "top":
-                    x = random.randint(0, app.WIDTH)
-                    y = -app.SPAWN_MARGIN
+                    x = view.left + self.rng.randint(0, app.WIDTH)
+                    y = view.top - app.SPAWN_MARGIN
                 elif side == "bottom":
-                    x = random.randint(0, app.WIDTH)
-                    y = app.HEIGHT + app.SPAWN_MARGIN
+                    x = view.left + self.rng.randint(0, app.WIDTH)
+                    y = view.bottom + app.SPAWN_MARGIN
                 elif side == "left":
-                    x = -app.SPAWN_MARGIN
-                    y = random.randint(0, app.HEIGHT)
+                    x = view.left - app.SPAWN_MARGIN
+                    y = view.top + self.rng.randint(0, app.HEIGHT)
                 else:
-                    x = app.WIDTH + app.SPAWN_MARGIN
-                    y = random.randint(0, app.HEIGHT)
+                    x = view.right + app.SPAWN_MARGIN
+                    y = view.top + self.rng.randint(0, app.HEIGHT)
 
-                # randomly select an enemy type and create an enemy
-                enemy_type = random.choice(list(self.assets["enemies"].keys()))
-                enemy = Enemy(x, y, enemy_type, self.assets["enemies"])
-                self.enemies.append(enemy)
+                # randomly select one of the wave's enemy types and create an enemy
+                enemy_type = self.rng.choice(enemy_types)
+                self.spawn_enemy(x, y, enemy_type)
 
-    def check_player_enemy_collisions(self):
-        """check if the player collides with any enemies."""
-        collided = False
-        for enemy in self.enemies:
-            if enemy.rect.colliderect(self.player.rect):
-                collided = True
-                break
+    def check_player_enemy_collisions(self, player):
+        """check if a player collides with any enemies."""
+        collided = bool(self.enemy_grid.colliding(player.rect))
 
         if collided:
             # player takes damage when colliding with an enemy
-            self.player.take_damage(1)
+            player.take_damage(1)
 
             # play sound effect when player is damaged
-            self.player_damaged_sfx.play()
-
-            # apply knockback effect to enemies based on player position
-            px, py = self.player.x, self.player.y
-            for enemy in self.enemies:
-                enemy.set_knockback(px, py, app.PUSHBACK_DISTANCE)
+            self.audio.play("player_damaged")
+
+            # push back the enemies around the player in one batch
+            px, py = player.x, player.y
+            radius = app.KNOCKBACK_RADIUS
+            if radius is None:
+                nearby = list(self.enemies)
+            else:
+                nearby = self.enemy_grid.query(
+                    pygame.Rect(px - radius, py - radius, 2 * radius, 2 * radius))
+            if not nearby:
+                return
+
+            if self.enemy_backend == "numpy":
+                self.enemies.knock_back([enemy.index for enemy in nearby], px, py)
+            else:
+                x = np.fromiter((enemy.x for enemy in nearby), dtype=np.float64, count=len(nearby))
+                y = np.fromiter((enemy.y for enemy in nearby), dtype=np.float64, count=len(nearby))
+                hit, dir_x, dir_y, dist = knockback_pushes(x, y, px, py)
+                pushed = [enemy for enemy, was_hit in zip(nearby, hit.tolist()) if was_hit]
+                for enemy, kx, ky, d in zip(pushed, dir_x.tolist(), dir_y.tolist(), dist.tolist()):
+                    enemy.knockback_dx = kx
+                    enemy.knockback_dy = ky
+                    enemy.knockback_dist_remaining = d
 
     def draw_game_over_screen(self):
         """draw the game over screen."""
-        # create a dark overlay
-        overlay = pygame.Surface((app.WIDTH, app.HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))
-        self.screen.blit(overlay, (0, 0))
+        # draw the dark overlay
+        self.renderer.blit(self.game_over_overlay, (0, 0))
 
         # render and draw "Game Over" text
-        game_over_surf = self.font_large.render("GAME OVER!", True, (255, 0, 0))
+        game_over_surf = self.text_cache.render(self.font_large, "GAME OVER!", (255, 0, 0))
         game_over_rect = game_over_surf.get_rect(center=(app.WIDTH // 2, app.HEIGHT // 2 - 50))
-        self.screen.blit(game_over_surf, game_over_rect)
+        self.renderer.blit(game_over_surf, game_over_rect)
 
         # render and draw the restart or quit prompt
-        prompt_surf = self.font_small.render("Press R to Play Again or ESC to Quit", True, (255, 255, 255))
+        prompt_surf = self.text_cache.render(
+            self.font_small, "Press R to Play Again or ESC to Quit", (255, 255, 255)
+        )
         prompt_rect = prompt_surf.get_rect(center=(app.WIDTH // 2, app.HEIGHT // 2 + 20))
-        self.screen.blit(prompt_surf, prompt_rect)
+        self.renderer.blit(prompt_surf, prompt_rect)
 
-    def update(self):
+    def update(self, inputs=None, co_op_inputs=()):
         """update the game state every frame."""
-        self.player.handle_input()
-        self.player.update()
-        self.check_player_enemy_collisions()
-        self.check_bullet_enemy_collisions()
-        self.check_player_coin_collisions()
+        profiler = self.profiler
+        all_inputs = self.player_inputs(inputs, co_op_inputs)
+        players = [player for player, _ in all_inputs]
+        with profiler.section("input"):
+            for player, player_input in all_inputs:
+                player.handle_input(player_input)
+        with profiler.section("player"):
+            # a spectating first player watches whoever is still playing
+            followed = self.player
+            if followed.spectator and players:
+                followed = players[0]
+            self.camera.follow(followed.x, followed.y)
+            for player in players:
+                # bullets are kept while they are on their own player's screen
+                if player is self.player:
+                    player.update(self.camera.view)
+                else:
+                    player.update(self.camera.view_at(player.x, player.y))
+        with profiler.section("player-enemy"):
+            for player in players:
+                self.check_player_enemy_collisions(player)
+        with profiler.section("bullet-enemy"):
+            for player in players:
+                self.check_bullet_enemy_collisions(player)
+        with profiler.section("player-coin"):
+            for player in players:
+                self.check_player_coin_collisions(player)
 
         # check if player collects any powerups
-        self.check_player_powerup_collisions()
+        with profiler.section("player-powerup"):
+            for player in players:
+                self.check_player_powerup_collisions(player)
+
+        # remove coins and powerups that have been on the floor too long
+        with profiler.section("pickups"):
+            self.pickups.expire(self.ticks)
 
         # update all enemies
-        for enemy in self.enemies:
-            enemy.update(self.player)
+        with profiler.section("enemies"):
+            self.update_enemies()
 
-        # end the game if the player has no health left
-        if self.player.health <= 0:
+        # re-bucket the enemies now they have moved, so the grid is up to date
+        # for aiming and collisions until they next move
+        with profiler.section("enemy grid"):
+            self.rebuild_enemy_grid()
+
+        # end the game once every player has no health left, a server only
+        # being watched by a spectator keeps waiting for someone to join
+        if self.playing_players() and not self.live_players():
             self.game_over = True
+            # play the player death sound once, as the game ends
+            self.audio.play("player_death")
             return
 
         # spawn new enemies if needed
-        self.spawn_enemies()
-
-    def check_player_coin_collisions(self):
-        """check if the player collects any coins."""
-        coins_collected = []
-        for coin in self.coins:
-            if coin.rect.colliderect(self.player.rect):
-                coins_collected.append(coin)
-                self.player.add_xp(1)
-
-                # play sound when coin is collected
-                self.coin_collection_sfx.play()
-
-        for c in coins_collected:
-            if c in self.coins:
-                self.coins.remove(c)
-
-    def check_player_powerup_collisions(self):
-        """check if the player collects any powerups."""
-        powerups_collected = []
-        for powerup in self.powerups:
-            if powerup.rect.colliderect(self.player.rect):
-                powerups_collected.append(powerup)
-
-                # play sound when powerup is collected
-                self.powerup_collection_sfx.play()
-
-                # apply the effect of the collected powerup
-                if self.powerup_effect == "speed_boost":
-                    self.player.increase_speed(10)
-                elif self.powerup_effect == "speed_up_bullets":
-                    self.player.speed_up_bullets(3)
-                elif self.powerup_effect == "more_bullets":
-                    self.player.increase_bullet_count(3)
-
-        for p in powerups_collected:
-            if p in self.powerups:
-                self.powerups.remove(p)
-
-    def draw(self):
-        """draw everything to the screen."""
-        self.screen.blit(self.background, (0, 0))
-
-        # draw all coins, powerups, enemies, and player
-        for coin in self.coins:
-            coin.draw(self.screen)
-
-        for powerup in self.powerups:
-            powerup.draw(self.screen)
+        with profiler.section("spawning"):
+            self.spawn_enemies()
+
+    def check_player_coin_collisions(self, player):
+        """check if a player collects any coins."""
+        coins_collected = self.pickups.colliding(player.rect, coins=True)
+        for i in coins_collected:
+            # a coin stack is worth its whole value
+            player.add_xp(int(self.pickups.value[i]))
+
+            # play sound when coin is collected
+            self.audio.play("coin_collection")
+
+        if len(coins_collected):
+            self.pickups.remove(coins_collected)
+
+    def check_player_powerup_collisions(self, player):
+        """check if a player collects any powerups."""
+        powerups_collected = self.pickups.colliding(player.rect, coins=False)
+        for _ in powerups_collected:
+            # play sound when powerup is collected
+            self.audio.play("powerup_collection")
+
+            # apply the effect of the collected powerup
+            if self.powerup_effect == "speed_boost":
+                player.increase_speed(10)
+            elif self.powerup_effect == "speed_up_bullets":
+                player.speed_up_bullets(3)
+            elif self.powerup_effect == "more_bullets":
+                player.increase_bullet_count(3)
+
+        if len(powerups_collected):
+            self.pickups.remove(powerups_collected)
+
+    def draw(self, alpha=1.0):
+        """draw everything to the screen.
+
+        alpha places moving sprites between their previous (0) and current (1)
+        tick positions. only what is near the camera's view gets drawn.
+        """
+        profiler = self.profiler
+
+        # keep the camera on the player as drawn, between ticks
+        player = self.player
+        if alpha == 1.0:
+            view = self.camera.view
+        else:
+            view = self.camera.view_at(player.prev_x + (player.x - player.prev_x) * alpha,
+                                       player.prev_y + (player.y - player.prev_y) * alpha)
+        self.drawn_view = view
+
+        # erase what was drawn last frame. when the camera moved, last frame is
+        # scrolled along with it and only the floor that came into view is drawn
+        with profiler.section("draw background"):
+            if view.topleft != self.background_view:
+                strips = None
+                if self.background_view is not None:
+                    strips = self.renderer.scroll(self.background_view[0] - view.left,
+                                                  self.background_view[1] - view.top)
+                if strips is None:
+                    self.world.draw(self.background, view)
+                else:
+                    for strip in strips:
+                        self.background.set_clip(strip)
+                        self.world.draw(self.background, view)
+                    self.background.set_clip(None)
+                self.background_view = view.topleft
+            self.renderer.begin_frame()
+
+        # queue all coins, powerups, enemies, and player, then draw them in one batch
+        queue = self.render_queue
+        with profiler.section("draw pickups"):
+            queue.extend(app.LAYER_PICKUPS, self.pickups.render_items(view))
+
+        with profiler.section("draw enemies"):
+            if self.enemy_backend == "numpy":
+                queue.extend(app.LAYER_ENEMIES, self.enemies.render_items(alpha, view))
+            else:
+                cull = view.inflate(2 * app.CULL_MARGIN, 2 * app.CULL_MARGIN)
+                items = []
+                for enemy in self.enemies:
+                    if cull.collidepoint(enemy.x, enemy.y):
+                        image, rect = enemy.render_item(alpha)
+                        items.append((image, rect.move(-view.left, -view.top)))
+                queue.extend(app.LAYER_ENEMIES, items)
+
+        with profiler.section("draw player"):
+            if not self.game_over:
+                for other in self.live_players():
+                    image, rect = other.render_item(alpha)
+                    queue.add(app.LAYER_PLAYER, image, rect.move(-view.left, -view.top))
+                    queue.extend(app.LAYER_BULLETS, other.bullets.render_items(alpha, view))
 
-        for enemy in self.enemies:
-            enemy.draw(self.screen)
+        with profiler.section("draw blits"):
+            queue.flush(self.renderer)
 
-        if not self.game_over:
-            self.player.draw(self.screen)
+        with profiler.section("draw hud"):
+            if self.game_over:
+                # draw the game over screen
+                self.draw_game_over_screen()
 
-        if self.game_over:
-            # play the player death sound when the game is over
-            self.player_death_sfx.play()
+            # display the player's health and XP
+            hp = max(0, min(self.player.health, 5))
+            health_img = self.assets["health"][hp]
+            self.renderer.blit(health_img, (10, 10))
 
-            # draw the game over screen
-            self.draw_game_over_screen()
+            self.hud_glyphs.draw(self.renderer, f"XP: {self.player.xp}", (10, 70))
 
-        # display the player's health and XP
-        hp = max(0, min(self.player.health, 5))
-        health_img = self.assets["health"][hp]
-        self.screen.blit(health_img, (10, 10))
+            # display the frame timings if they're switched on
+            if self.show_profiler:
+                self.profiler.draw_overlay(self.renderer, self.font_tiny)
 
-        xp_text_surf = self.font_small.render(f"XP: {self.player.xp}", True, (255, 255, 255))
-        self.screen.blit(xp_text_surf, (10, 70))
+        with profiler.section("present"):
+            self.renderer.end_frame()  # update the display
 
-        pygame.display.flip()  # update the display
\ No newline at end of file
+        if self.time_to_first_frame is None:
+            self.time_to_first_frame = time.perf_counter() - self.start_time
@@ -0,0 +1,398 @@
+import numpy as np
+
+import app
+from camera import in_view, to_pixels
+from enemy import knockback_pushes, nearest_players
+from flocking import separation_cells, separation_forces
+from pool import ObjectPool
+
+
+# every per-enemy array the horde keeps, and its type
+FIELDS = {
+    "x": np.float64,
+    "y": np.float64,
+    "prev_x": np.float64,
+    "prev_y": np.float64,
+    "speed": np.float64,
+    "knockback_dx": np.float64,
+    "knockback_dy": np.float64,
+    "knockback_dist_remaining": np.float64,
+    "facing_left": np.bool_,
+    "type_index": np.int32,
+    "frame_index": np.int32,
+    "animation_timer": np.int32,
+}
+
+
+class EnemyView:
+    """a thin handle onto one enemy stored inside an EnemyHorde.
+
+    it has the same attributes and methods the game uses on an Enemy, but all
+    the state lives in the horde's arrays.
+    """
+
+    __slots__ = ("horde", "index")
+
+    def __init__(self, horde, index):
+        self.horde = horde
+        self.index = index
+
+    def reset(self, horde, index):
+        # point a pooled view at a newly spawned enemy
+        self.horde = horde
+        self.index = index
+
+    @property
+    def x(self):
+        return float(self.horde.x[self.index])
+
+    @x.setter
+    def x(self, value):
+        self.horde.x[self.index] = value
+
+    @property
+    def y(self):
+        return float(self.horde.y[self.index])
+
+    @y.setter
+    def y(self, value):
+        self.horde.y[self.index] = value
+
+    @property
+    def speed(self):
+        return float(self.horde.speed[self.index])
+
+    @speed.setter
+    def speed(self, value):
+        self.horde.speed[self.index] = value
+
+    @property
+    def enemy_type(self):
+        return self.horde.types[self.horde.type_index[self.index]]
+
+    @property
+    def facing_left(self):
+        return bool(self.horde.facing_left[self.index])
+
+    @property
+    def frame_index(self):
+        return int(self.horde.frame_index[self.index])
+
+    @property
+    def knockback_dist_remaining(self):
+        return float(self.horde.knockback_dist_remaining[self.index])
+
+    @property
+    def image(self):
+        horde = self.horde
+        return horde.frames[horde.type_index[self.index]][horde.frame_index[self.index]]
+
+    @property
+    def rect(self):
+        # built on demand, matching how Enemy keeps its rect centred on (x, y)
+        rect = self.image.get_rect()
+        rect.center = (self.horde.x[self.index], self.horde.y[self.index])
+        return rect
+
+    def render_item(self):
+        # use the pre-flipped frame if facing left
+        horde = self.horde
+        i = self.index
+        if horde.facing_left[i]:
+            image = horde.flipped_frames[horde.type_index[i]][horde.frame_index[i]]
+        else:
+            image = self.image
+        return image, self.rect
+
+    def draw(self, surface):
+        surface.blit(*self.render_item())
+
+
+class EnemyHorde:
+    def __init__(self, enemy_assets, flipped_assets=None, capacity=256):
+        """initialise an empty horde able to hold `capacity` enemies before growing."""
+        # enemy types are stored as indexes into these lists
+        self.types = list(enemy_assets.keys())
+        self.frames = [enemy_assets[t] for t in self.types]
+        if flipped_assets is not None:
+            self.flipped_frames = [flipped_assets[t] for t in self.types]
+        else:
+            self.flipped_frames = [app.flip_frames(frames) for frames in self.frames]
+        self.frame_counts = np.array([len(f) for f in self.frames], dtype=np.int32)
+        # the biggest frame of each type, used to size spatial grid queries
+        self.type_widths = np.array(
+            [max(frame.get_width() for frame in f) for f in self.frames], dtype=np.int64)
+        self.type_heights = np.array(
+            [max(frame.get_height() for frame in f) for f in self.frames], dtype=np.int64)
+        self.animation_speed = 8
+
+        self.count = 0
+        self.views = []
+        # views of removed enemies, reused for new ones
+        self.view_pool = ObjectPool(EnemyView)
+        self.allocate(capacity)
+
+    def prewarm(self, count):
+        """make room for `count` enemies up front, so spawning doesn't allocate."""
+        if count > self.capacity:
+            self.allocate(count)
+        self.view_pool.prewarm(count - self.count, self, -1)
+
+    def allocate(self, capacity):
+        """(re)allocate the arrays, keeping the enemies already stored."""
+        old = self.count
+        for name, dtype in FIELDS.items():
+            array = np.zeros(capacity, dtype=dtype)
+            if old:
+                array[:old] = getattr(self, name)[:old]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.views)
+
+    def clear(self):
+        """remove every enemy."""
+        for view in self.views:
+            view.index = -1
+            self.view_pool.release(view)
+        self.views = []
+        self.count = 0
+
+    def spawn(self, x, y, enemy_type, speed=app.DEFAULT_ENEMY_SPEED):
+        """add an enemy and return the view used to refer to it."""
+        if self.count == self.capacity:
+            self.allocate(self.capacity * 2)
+
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.prev_x[i] = x
+        self.prev_y[i] = y
+        self.speed[i] = speed
+        self.knockback_dx[i] = 0
+        self.knockback_dy[i] = 0
+        self.knockback_dist_remaining[i] = 0
+        self.facing_left[i] = False
+        self.type_index[i] = self.types.index(enemy_type)
+        self.frame_index[i] = 0
+        self.animation_timer[i] = 0
+        self.count += 1
+
+        view = self.view_pool.acquire(self, i)
+        self.views.append(view)
+        return view
+
+    def remove(self, view):
+        """remove an enemy by moving the last enemy into its slot."""
+        i = view.index
+        if i < 0 or i >= self.count or self.views[i] is not view:
+            raise ValueError("enemy is not in this horde")
+
+        last = self.count - 1
+        if i != last:
+            for name in FIELDS:
+                array = getattr(self, name)
+                array[i] = array[last]
+            moved = self.views[last]
+            moved.index = i
+            self.views[i] = moved
+
+        self.views.pop()
+        view.index = -1
+        self.view_pool.release(view)
+        self.count = last
+
+    def load_arrays(self, count, arrays):
+        """replace every enemy with `count` enemies taken from `arrays` (field name -> array)."""
+        if count > self.capacity:
+            self.allocate(max(count, self.capacity * 2))
+        for name in FIELDS:
+            getattr(self, name)[:count] = arrays[name]
+
+        # keep one view per enemy, handing spare ones back to the pool
+        views = self.views
+        while len(views) > count:
+            view = views.pop()
+            view.index = -1
+            self.view_pool.release(view)
+        while len(views) < count:
+            views.append(self.view_pool.acquire(self, len(views)))
+        self.count = count
+
+    def render_items(self, alpha=1.0, view=None):
+        """return an (image, top left) pair for every enemy, for drawing in a batch.
+
+        alpha places each enemy between its previous (0) and current (1) tick
+        position. with a view (a Rect in world coordinates) only the enemies
+        near it are returned, placed relative to its top left.
+        """
+        n = self.count
+        if n == 0:
+            return []
+        x = self.x[:n]
+        y = self.y[:n]
+        if alpha != 1.0:
+            x = self.prev_x[:n] + (x - self.prev_x[:n]) * alpha
+            y = self.prev_y[:n] + (y - self.prev_y[:n]) * alpha
+        shown = slice(None)
+        offset_x = offset_y = 0
+        if view is not None:
+            shown = np.flatnonzero(in_view(x, y, view))
+            x = x[shown]
+            y = y[shown]
+            offset_x, offset_y = view.topleft
+
+        type_index = self.type_index[:n][shown].tolist()
+        frame_index = self.frame_index[:n][shown].tolist()
+        facing_left = self.facing_left[:n][shown].tolist()
+        frames = self.frames
+        flipped_frames = self.flipped_frames
+        images = [
+            (flipped_frames if left else frames)[t][f]
+            for t, f, left in zip(type_index, frame_index, facing_left)
+        ]
+
+        # place each sprite the way a Rect centred on (x, y) would be placed,
+        # pygame rounds the centre half away from zero
+        widths = np.array([image.get_width() for image in images], dtype=np.int64)
+        heights = np.array([image.get_height() for image in images], dtype=np.int64)
+        left = (to_pixels(x) - widths // 2 - offset_x).tolist()
+        top = (to_pixels(y) - heights // 2 - offset_y).tolist()
+        return list(zip(images, zip(left, top)))
+
+    def max_half_size(self):
+        """return the largest half-width and half-height of any enemy's sprite."""
+        types = self.type_index[:self.count]
+        if len(types) == 0:
+            return 0, 0
+        return (
+            (int(self.type_widths[types].max()) + 1) // 2,
+            (int(self.type_heights[types].max()) + 1) // 2,
+        )
+
+    def bounds(self):
+        """return the left, top, right and bottom of a rect around every enemy.
+
+        each rect is centred where the enemy's own rect would be but sized to
+        the biggest frame of its type, so it always contains the real one.
+        """
+        n = self.count
+        x = self.x[:n]
+        y = self.y[:n]
+        types = self.type_index[:n]
+        widths = self.type_widths[types]
+        heights = self.type_heights[types]
+        left = to_pixels(x) - widths // 2
+        top = to_pixels(y) - heights // 2
+        return left, top, left + widths, top + heights
+
+    def cell_keys(self, cell_size, start=0, end=None):
+        """return the grid cell (x and y arrays) holding each enemy's rect centre.
+
+        the centre is rounded the way pygame places a Rect, so the cells match
+        what SpatialGrid.insert() would pick from each enemy's rect.
+        """
+        end = self.count if end is None else end
+        x = self.x[start:end]
+        y = self.y[start:end]
+        return to_pixels(x) // cell_size, to_pixels(y) // cell_size
+
+    def separation_cells(self):
+        """bucket every enemy for separation(), so the chunks can share one bucketing."""
+        n = self.count
+        return separation_cells(self.x[:n], self.y[:n])
+
+    def separation(self, start=0, end=None, cells=None):
+        """return the push away from nearby enemies for enemies start..end.
+
+        cells is the bucketing from separation_cells(), made here if not given.
+        """
+        n = self.count
+        return separation_forces(self.x[:n], self.y[:n], start=start, end=end, cells=cells)
+
+    def knock_back(self, indices, px, py):
+        """push the enemies at `indices` away from (px, py), see knockback_pushes()."""
+        indices = np.asarray(indices, dtype=np.intp)
+        hit, dir_x, dir_y, dist = knockback_pushes(self.x[indices], self.y[indices], px, py)
+        indices = indices[hit]
+        self.knockback_dx[indices] = dir_x
+        self.knockback_dy[indices] = dir_y
+        self.knockback_dist_remaining[indices] = dist
+
+    def update(self, players, start=0, end=None, separation=None):
+        """advance enemies start..end by one tick, the batched form of Enemy.update.
+
+        each enemy chases whichever of `players` is nearest to it.
+
+        separation is the (x, y) push away from neighbours for the same
+        enemies, from separation(). it is worked out before anyone moves, so
+        separate ranges can be updated at the same time.
+        """
+        end = self.count if end is None else end
+        if end <= start:
+            return
+        s = slice(start, end)
+        x = self.x[s]
+        y = self.y[s]
+        # remember where this tick started
+        self.prev_x[s] = x
+        self.prev_y[s] = y
+        facing_left = self.facing_left[s]
+        remaining = self.knockback_dist_remaining[s]
+
+        # enemies being knocked back slide away from the player
+        knocked = remaining > 0
+        step = np.minimum(app.ENEMY_KNOCKBACK_SPEED, remaining[knocked])
+        remaining[knocked] -= step
+        kb_dx = self.knockback_dx[s][knocked]
+        x[knocked] += kb_dx * step
+        y[knocked] += self.knockback_dy[s][knocked] * step
+        facing_left[knocked] = kb_dx < 0
+
+        # every other enemy walks straight towards its nearest player
+        chasing = ~knocked
+        if len(players) == 1:
+            target_x, target_y = players[0].x, players[0].y
+        else:
+            nearest = nearest_players(x[chasing], y[chasing], players)
+            target_x = np.array([player.x for player in players])[nearest]
+            target_y = np.array([player.y for player in players])[nearest]
+        dx = target_x - x[chasing]
+        dy = target_y - y[chasing]
+        dist = np.sqrt(dx * dx + dy * dy)
+        moving = dist != 0
+        steer_x = np.zeros_like(dist)
+        steer_y = np.zeros_like(dist)
+        steer_x[moving] = dx[moving] / dist[moving]
+        steer_y[moving] = dy[moving] / dist[moving]
+        if separation is not None:
+            # blend in the push away from nearby enemies, capped at full speed.
+            # like Enemy.move_toward_player, only enemies actually pushed are
+            # renormalised, so both backends give bit-for-bit the same result
+            sep_x = separation[0][chasing]
+            sep_y = separation[1][chasing]
+            pushed = (sep_x != 0) | (sep_y != 0)
+            push_x = steer_x[pushed] + sep_x[pushed] * app.SEPARATION_WEIGHT
+            push_y = steer_y[pushed] + sep_y[pushed] * app.SEPARATION_WEIGHT
+            length = np.sqrt(push_x * push_x + push_y * push_y)
+            over = length > 1
+            push_x[over] /= length[over]
+            push_y[over] /= length[over]
+            steer_x[pushed] = push_x
+            steer_y[pushed] = push_y
+        speed = self.speed[s][chasing]
+        x[chasing] += steer_x * speed
+        y[chasing] += steer_y * speed
+        facing_left[chasing] = dx < 0
+
+        # advance the animation of every enemy whose timer has run out
+        timer = self.animation_timer[s]
+        timer += 1
+        ready = timer >= self.animation_speed
+        timer[ready] = 0
+        frame_index = self.frame_index[s]
+        frame_index[ready] = (frame_index[ready] + 1) % self.frame_counts[self.type_index[s][ready]]
@@ -0,0 +1,139 @@
+import time
+
+import pygame
+
+import app
+
+# actions read from the keys held down at the moment a tick's input is sampled
+MOVEMENT_ACTIONS = ("left", "right", "up", "down")
+
+
+def whole_position(position):
+    """return (x, y) rounded to whole pixels, or None if there is no position.
+
+    aimed shots are kept to whole pixels, the precision replays store them
+    at, so a recorded game and its replay shoot at exactly the same spot.
+    """
+    if position is None:
+        return None
+    return (round(position[0]), round(position[1]))
+
+
+class TickInput:
+    def __init__(self, left=False, right=False, up=False, down=False,
+                 shoot_nearest=False, shoot_at=None, reset=False):
+        """everything the player asked for during one logic tick."""
+        # movement keys held down this tick
+        self.left = left
+        self.right = right
+        self.up = up
+        self.down = down
+
+        # shoot towards the nearest enemy this tick
+        self.shoot_nearest = shoot_nearest
+        # (x, y) position to shoot towards this tick, or None
+        self.shoot_at = whole_position(shoot_at)
+
+        # restart the game from the game over screen
+        self.reset = reset
+
+    def held(self):
+        """return a copy with only the held movement keys, for catch-up ticks."""
+        return TickInput(self.left, self.right, self.up, self.down)
+
+    def carry_over(self, earlier):
+        """keep the one-off actions of an earlier input that no tick has used yet."""
+        self.shoot_nearest = self.shoot_nearest or earlier.shoot_nearest
+        if self.shoot_at is None:
+            self.shoot_at = earlier.shoot_at
+        self.reset = self.reset or earlier.reset
+
+    @classmethod
+    def from_keys(cls, keys, bindings=app.KEY_BINDINGS):
+        """build the movement part of the input from pygame.key.get_pressed()."""
+        return cls(**{
+            action: any(keys[key] for key in bindings[action])
+            for action in MOVEMENT_ACTIONS
+        })
+
+
+class InputMapper:
+    def __init__(self, key_bindings=app.KEY_BINDINGS, mouse_bindings=app.MOUSE_BINDINGS):
+        """turn pygame events into named actions and buffer them for the next tick.
+
+        poll() reads the waiting events and returns the actions they trigger,
+        and the game press()es the ones meant for the simulation. sample()
+        then hands everything pressed since the last tick over as one
+        TickInput, with the movement keys read at that moment, so a tick
+        always gets the newest input there is.
+        """
+        self.key_bindings = key_bindings
+        self.key_actions = {key: action for action, keys in key_bindings.items() for key in keys}
+        self.mouse_actions = {
+            button: action for action, buttons in mouse_bindings.items() for button in buttons
+        }
+
+        # one-off actions pressed since the last sample
+        self.buffer = TickInput()
+        # perf_counter_ns() when the oldest input not yet sampled was read
+        self.oldest = None
+        # the same for the inputs handed over by the last sample, cleared
+        # once the frame showing them has been timed
+        self.sampled_since = None
+        self.poll_time = 0
+
+    def poll(self):
+        """return an (action, mouse position or None) pair for each action triggered."""
+        self.poll_time = time.perf_counter_ns()
+        actions = []
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                actions.append(("quit", None))
+            elif event.type == pygame.KEYDOWN:
+                action = self.key_actions.get(event.key)
+                if action is not None:
+                    actions.append((action, None))
+                    # starting to move counts as input, though it is read at sample()
+                    if action in MOVEMENT_ACTIONS:
+                        self.mark_input()
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                action = self.mouse_actions.get(event.button)
+                if action is not None:
+                    actions.append((action, event.pos))
+        return actions
+
+    def mark_input(self):
+        if self.oldest is None:
+            self.oldest = self.poll_time
+
+    def press(self, action, position=None):
+        """buffer a one-off action from the last poll() for the next tick."""
+        if action == "shoot_at":
+            self.buffer.shoot_at = whole_position(position)
+        else:
+            setattr(self.buffer, action, True)
+        self.mark_input()
+
+    def sample(self):
+        """return the TickInput for the next tick, emptying the buffer."""
+        inputs = TickInput.from_keys(pygame.key.get_pressed(), self.key_bindings)
+        inputs.carry_over(self.buffer)
+        self.buffer = TickInput()
+        if self.oldest is not None:
+            self.sampled_since = self.oldest
+        self.oldest = None
+        return inputs
+
+    def latency(self):
+        """return nanoseconds from reading the last sampled input until now, once.
+
+        called straight after a frame is presented this is the input to photon
+        latency of that frame, measured from when the input was read rather
+        than when it happened, so it is short by up to one frame. returns None
+        if the frame showed no new input.
+        """
+        if self.sampled_since is None:
+            return None
+        latency = time.perf_counter_ns() - self.sampled_since
+        self.sampled_since = None
+        return latency
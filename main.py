@@ -1,9 +1,100 @@
 # main.py
+import argparse
+import sys
+import time
+
+import app
 from game import Game
+from netplay import CoopServer
+from replay import run_replay
+from snapshot import load_snapshot
 
 def main():
-    game = Game()
-    game.run()
+    parser = argparse.ArgumentParser(description="Shooter")
+    parser.add_argument("--headless", action="store_true",
+                        help="run the game logic without a window, as fast as possible")
+    parser.add_argument("--ticks", type=int, default=3600,
+                        help="number of ticks to simulate in headless mode")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for the random number generator")
+    parser.add_argument("--backend", choices=("objects", "numpy"), default=app.ENEMY_BACKEND,
+                        help="how enemies are stored and updated")
+    parser.add_argument("--parallel", action="store_true",
+                        help="with --backend numpy, update the enemies on a thread pool")
+    parser.add_argument("--startup-time", action="store_true",
+                        help="print how long it took to get the first frame drawn")
+    parser.add_argument("--profile-out", metavar="PATH",
+                        help="write every frame's stage timings to a .csv or .json file")
+    parser.add_argument("--record", metavar="PATH",
+                        help="record every tick's input to a replay file")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="re-run a recorded replay headlessly at full speed")
+    parser.add_argument("--checksums", metavar="PATH",
+                        help="with --replay, write a state checksum per tick to PATH")
+    parser.add_argument("--verify", metavar="PATH",
+                        help="with --replay, compare the checksums against PATH")
+    parser.add_argument("--restore", metavar="PATH",
+                        help="start from a snapshot file, such as a crash dump")
+    parser.add_argument("--serve", metavar="PORT", type=int, nargs="?", const=app.NET_PORT,
+                        help=f"host a headless co-op server on {app.NET_HOST} "
+                             f"(port {app.NET_PORT} by default)")
+    args = parser.parse_args()
+    if args.restore and args.record:
+        # a replay can only start from a freshly seeded game
+        parser.error("--record can't be used with --restore")
+
+    if args.replay:
+        start = time.perf_counter()
+        bad_tick = run_replay(args.replay, args.checksums, args.verify)
+        print(f"replayed {args.replay} in {time.perf_counter() - start:.2f}s")
+        if args.verify:
+            if bad_tick is None:
+                print("replay is deterministic, every checksum matches")
+            else:
+                print(f"replay diverged at tick {bad_tick}")
+                sys.exit(1)
+        return
+
+    serving = args.serve is not None
+    game = Game(enemy_backend=args.backend, headless=args.headless or serving, seed=args.seed,
+                profile=bool(args.profile_out), parallel=args.parallel)
+    if args.startup_time:
+        if args.headless:
+            # headless runs never draw, so draw a single frame just to time it
+            game.draw()
+            print(f"time to first frame: {game.time_to_first_frame * 1000:.1f} ms")
+    if args.restore:
+        load_snapshot(game, args.restore)
+    if serving:
+        server = CoopServer(game, port=args.serve)
+        host, port = server.address
+        print(f"co-op server listening on {host}:{port}, ctrl+c to stop")
+        try:
+            server.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+        return
+    if args.record:
+        game.start_recording(args.record)
+    if args.headless:
+        start = time.perf_counter()
+        start_ticks = game.ticks
+        game.run_headless(args.ticks)
+        game.stop_recording()
+        elapsed = time.perf_counter() - start
+        ticks = game.ticks - start_ticks
+        print(f"{ticks} ticks in {elapsed:.2f}s ({ticks / elapsed:.0f} ticks/s)")
+        if args.profile_out:
+            print("\n".join(game.profiler.summary_lines()))
+    else:
+        game.run()
+        if args.startup_time:
+            print(f"time to first frame: {game.time_to_first_frame * 1000:.1f} ms")
+
+    if args.profile_out:
+        game.profiler.export(args.profile_out)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,412 @@
+import selectors
+import socket
+import struct
+import time
+import zlib
+
+import numpy as np
+
+import app
+from inputs import TickInput
+from replay import FLAG_SHOOT_AT, flags_to_input, input_flags
+from snapshot import enemy_arrays
+
+# every message either way is a 4 byte length followed by the payload.
+# the server greets each client with WELCOME, then sends one SNAPSHOT per tick:
+#   header (tick, newest input used, the client's player number, whether the
+#   game is over and each table's size), then the entity tables compressed
+#   together with zlib
+# clients send one INPUT whenever they like, the newest one is used each tick.
+#
+# each table is a set of columns, one small integer per entity, and is sent
+# as the difference from the last table sent to the same client, matched up
+# by position in the table. positions are stored in 1 / NET_POSITION_SCALE
+# pixel steps, offset by NET_POSITION_MARGIN so enemies off the edge fit.
+NET_MAGIC = b"SHNT"
+NET_VERSION = 2
+LENGTH = struct.Struct("<I")
+WELCOME = struct.Struct("<4sBB")
+INPUT = struct.Struct("<IBhh")
+SNAPSHOT = struct.Struct("<IIB?BIII")
+
+# table name -> column name -> type
+TABLES = {
+    "players": {"x": np.uint16, "y": np.uint16, "health": np.uint8,
+                "facing_left": np.uint8, "xp": np.uint32},
+    "enemies": {"x": np.uint16, "y": np.uint16, "type_index": np.uint8,
+                "frame_index": np.uint8, "facing_left": np.uint8},
+    "bullets": {"x": np.uint16, "y": np.uint16, "size": np.uint8},
+    "pickups": {"x": np.uint16, "y": np.uint16, "kind": np.uint8},
+}
+
+
+def quantize_positions(values):
+    """turn world positions into the fixed point steps sent over the wire."""
+    steps = np.rint((np.asarray(values, dtype=np.float64) + app.NET_POSITION_MARGIN)
+                    * app.NET_POSITION_SCALE)
+    return np.clip(steps, 0, np.iinfo(np.uint16).max).astype(np.uint16)
+
+
+def dequantize_positions(steps):
+    """turn fixed point steps back into world positions."""
+    return steps / app.NET_POSITION_SCALE - app.NET_POSITION_MARGIN
+
+
+def game_tables(game):
+    """return the state a client needs to draw `game`, quantized into TABLES."""
+    players = game.players
+    enemies = enemy_arrays(game)
+    n = len(game.enemies)
+    bullet_x = np.concatenate([player.bullets.x[:player.bullets.count] for player in players])
+    bullet_y = np.concatenate([player.bullets.y[:player.bullets.count] for player in players])
+    bullet_size = np.concatenate(
+        [player.bullets.size[:player.bullets.count] for player in players])
+    pickups = game.pickups
+    return {
+        "players": {
+            "x": quantize_positions([player.x for player in players]),
+            "y": quantize_positions([player.y for player in players]),
+            # spectators are sent with no health, so clients don't draw them
+            "health": np.array([0 if player.spectator else min(max(player.health, 0), 255)
+                                for player in players], dtype=np.uint8),
+            "facing_left": np.array([player.facing_left for player in players], dtype=np.uint8),
+            "xp": np.array([player.xp for player in players], dtype=np.uint32),
+        },
+        "enemies": {
+            "x": quantize_positions(enemies["x"][:n]),
+            "y": quantize_positions(enemies["y"][:n]),
+            "type_index": enemies["type_index"][:n].astype(np.uint8),
+            "frame_index": enemies["frame_index"][:n].astype(np.uint8),
+            "facing_left": enemies["facing_left"][:n].astype(np.uint8),
+        },
+        "bullets": {
+            "x": quantize_positions(bullet_x),
+            "y": quantize_positions(bullet_y),
+            "size": np.clip(bullet_size, 0, 255).astype(np.uint8),
+        },
+        "pickups": {
+            "x": quantize_positions(pickups.x[:pickups.count]),
+            "y": quantize_positions(pickups.y[:pickups.count]),
+            "kind": pickups.kind[:pickups.count].astype(np.uint8),
+        },
+    }
+
+
+def column_against(baseline, count, dtype):
+    """return the baseline column cut or zero padded to `count` entries."""
+    if baseline is None:
+        return np.zeros(count, dtype=dtype)
+    if len(baseline) >= count:
+        return baseline[:count]
+    padded = np.zeros(count, dtype=dtype)
+    padded[:len(baseline)] = baseline
+    return padded
+
+
+def encode_tables(tables, baseline=None):
+    """return `tables` as compressed differences from `baseline` (None sends them whole).
+
+    the bytes of each column are split into planes, all the low bytes then all
+    the high bytes, since the small differences leave most high bytes zero
+    and zlib packs long runs of them down to almost nothing.
+    """
+    parts = []
+    for table, columns in TABLES.items():
+        for column, dtype in columns.items():
+            values = tables[table][column]
+            previous = baseline[table][column] if baseline else None
+            base = column_against(previous, len(values), dtype)
+            # unsigned subtraction wraps around, and wraps back when added
+            delta = values - base
+            parts.append(delta.view(np.uint8).reshape(-1, delta.itemsize).T.tobytes())
+    return zlib.compress(b"".join(parts), app.NET_COMPRESSION)
+
+
+def decode_tables(data, counts, baseline=None):
+    """undo encode_tables(), `counts` being the number of entities in each table."""
+    data = zlib.decompress(data)
+    tables = {}
+    offset = 0
+    for table, columns in TABLES.items():
+        count = counts[table]
+        tables[table] = {}
+        for column, dtype in columns.items():
+            itemsize = np.dtype(dtype).itemsize
+            size = count * itemsize
+            planes = np.frombuffer(data, dtype=np.uint8, count=size, offset=offset)
+            offset += size
+            delta = planes.reshape(itemsize, count).T.copy().view(dtype).reshape(count)
+            previous = baseline[table][column] if baseline else None
+            base = column_against(previous, count, dtype)
+            tables[table][column] = delta + base
+    return tables
+
+
+def raw_size(tables):
+    """bytes the tables would take sent whole and uncompressed."""
+    return sum(values.nbytes for columns in tables.values() for values in columns.values())
+
+
+class MessageReader:
+    def __init__(self):
+        """split a byte stream back into the length prefixed messages it carries."""
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """add received bytes and return every message now complete."""
+        self.buffer += data
+        messages = []
+        while len(self.buffer) >= LENGTH.size:
+            (size,) = LENGTH.unpack_from(self.buffer)
+            end = LENGTH.size + size
+            if len(self.buffer) < end:
+                break
+            messages.append(bytes(self.buffer[LENGTH.size:end]))
+            del self.buffer[:end]
+        return messages
+
+
+def send_message(sock, payload):
+    """send one length prefixed message, returning the bytes written."""
+    sock.sendall(LENGTH.pack(len(payload)) + payload)
+    return LENGTH.size + len(payload)
+
+
+class ClientConnection:
+    def __init__(self, sock):
+        """the server's end of one client's connection."""
+        self.sock = sock
+        self.reader = MessageReader()
+        # input for the next tick, with any one-off actions not used yet
+        self.inputs = TickInput()
+        # sequence number of the newest input received
+        self.input_sequence = 0
+        # the tables last sent, which the next snapshot is a difference from
+        self.baseline = None
+
+
+class CoopServer:
+    def __init__(self, game, host=app.NET_HOST, port=app.NET_PORT):
+        """run `game` as the authoritative simulation for clients on a local socket.
+
+        every client that connects gets a co-op player of its own, the game's
+        first player stays with the host as a spectator, as no one plays at
+        the server. clients and co-op players are kept in the same order, so
+        self.clients[i] plays self.game.players[i + 1].
+        port 0 picks any free port, see self.address for the one used.
+        """
+        self.game = game
+        game.player.spectator = True
+        self.listener = socket.create_server((host, port))
+        self.listener.setblocking(False)
+        self.address = self.listener.getsockname()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.clients = []
+
+        # bytes sent, the size they would have been sent whole, and the time
+        # spent building and compressing snapshots, for the benchmark
+        self.bytes_sent = 0
+        self.raw_bytes = 0
+        self.snapshots_sent = 0
+        self.encode_seconds = 0.0
+
+    def poll(self, timeout=0):
+        """accept new clients and read the inputs waiting from every client."""
+        for key, _ in self.selector.select(timeout):
+            if key.fileobj is self.listener:
+                self.accept()
+            else:
+                self.receive(key.data)
+
+    def accept(self):
+        sock, _ = self.listener.accept()
+        # sends block, so a client that can't keep up slows the server down
+        # rather than being sent a broken stream, but only for so long. one
+        # that stops reading altogether is dropped once the timeout runs out
+        sock.settimeout(app.NET_SEND_TIMEOUT)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = ClientConnection(sock)
+        self.game.add_player()
+        self.clients.append(client)
+        self.selector.register(sock, selectors.EVENT_READ, client)
+        try:
+            self.bytes_sent += send_message(sock, WELCOME.pack(
+                NET_MAGIC, NET_VERSION, len(self.clients)))
+        except OSError:
+            self.disconnect(client)
+
+    def receive(self, client):
+        try:
+            data = client.sock.recv(65536)
+        except OSError:
+            data = b""
+        if not data:
+            self.disconnect(client)
+            return
+        for message in client.reader.feed(data):
+            try:
+                sequence, flags, x, y = INPUT.unpack(message)
+            except struct.error:
+                # not an input message, the client is broken or not a client at all
+                self.disconnect(client)
+                return
+            inputs = flags_to_input(flags, (x, y) if flags & FLAG_SHOOT_AT else None)
+            inputs.carry_over(client.inputs)
+            client.inputs = inputs
+            client.input_sequence = sequence
+
+    def disconnect(self, client):
+        self.selector.unregister(client.sock)
+        client.sock.close()
+        player = self.game.players[self.clients.index(client) + 1]
+        self.clients.remove(client)
+        self.game.remove_player(player)
+
+    def wait_for_clients(self, count, timeout=5.0):
+        """accept connections until `count` clients are connected or time runs out."""
+        deadline = time.perf_counter() + timeout
+        while len(self.clients) < count and time.perf_counter() < deadline:
+            self.poll(deadline - time.perf_counter())
+        return len(self.clients) >= count
+
+    def step(self, inputs=None):
+        """run one tick with the host's `inputs` and every client's, then send the results."""
+        self.poll()
+        self.game.step(inputs or TickInput(), [client.inputs for client in self.clients])
+        for client in self.clients:
+            # one-off actions happen once, held keys stay held until the next input
+            client.inputs = client.inputs.held()
+        self.send_snapshots()
+
+    def send_snapshots(self):
+        """send every client this tick's state as a difference from what it last got."""
+        if not self.clients:
+            return
+        game = self.game
+        start = time.perf_counter()
+        tables = None
+        for client in list(self.clients):
+            if tables is None:
+                tables = game_tables(game)
+                counts = [len(tables[table]["x"]) for table in TABLES]
+                size = raw_size(tables)
+            # worked out per client, a client dropped earlier in the loop moves
+            # everyone after it down a player
+            player_number = self.clients.index(client) + 1
+            payload = SNAPSHOT.pack(
+                game.ticks, client.input_sequence, player_number, game.game_over, *counts,
+            ) + encode_tables(tables, client.baseline)
+            self.encode_seconds += time.perf_counter() - start
+            try:
+                self.bytes_sent += send_message(client.sock, payload)
+            except OSError:
+                # gone, or stopped reading for longer than NET_SEND_TIMEOUT,
+                # either way the rest of its stream can't be sent
+                self.disconnect(client)
+                # its player is gone, so the clients after it get fresh tables
+                tables = None
+                continue
+            client.baseline = tables
+            self.raw_bytes += size
+            self.snapshots_sent += 1
+            start = time.perf_counter()
+
+    def wait_until(self, deadline):
+        """wait for time.perf_counter() to reach `deadline`, picking up inputs as they arrive."""
+        while (wait := deadline - time.perf_counter()) > 0:
+            self.poll(wait)
+
+    def run(self, ticks=None, realtime=True):
+        """step the game at TICK_RATE (or as fast as possible) until `ticks` have run."""
+        tick_length = 1.0 / app.TICK_RATE
+        next_tick = time.perf_counter()
+        ran = 0
+        while ticks is None or ran < ticks:
+            if realtime:
+                self.wait_until(next_tick)
+                # a tick that ran long is not made up for with a burst of short ones
+                next_tick = max(next_tick + tick_length, time.perf_counter())
+            self.step()
+            ran += 1
+
+    def close(self):
+        for client in list(self.clients):
+            self.disconnect(client)
+        self.selector.close()
+        self.listener.close()
+
+
+class CoopClient:
+    def __init__(self, address, timeout=5.0):
+        """connect to a CoopServer.
+
+        the server's greeting is read along with the first snapshot, so the
+        server and client can also take turns on the same thread.
+        """
+        self.sock = socket.create_connection(address, timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = MessageReader()
+        self.messages = []
+        self.bytes_received = 0
+        # index of this client's player in the server's game, once greeted
+        self.player_index = None
+
+        # the newest state received, still quantized, and the tick it is from
+        self.tables = None
+        self.tick = -1
+        # set once every player is dead, until someone sends a reset
+        self.game_over = False
+
+        # inputs sent and not yet seen by the server, sequence -> time sent
+        self.sequence = 0
+        self.unacknowledged = {}
+        # seconds from sending each input to getting the first snapshot that used it
+        self.latencies = []
+
+    def next_message(self):
+        while not self.messages:
+            data = self.sock.recv(65536)
+            if not data:
+                raise ConnectionError("server closed the connection")
+            self.bytes_received += len(data)
+            self.messages += self.reader.feed(data)
+        return self.messages.pop(0)
+
+    def send_input(self, inputs):
+        """send this client's input for the next tick."""
+        self.sequence += 1
+        x, y = inputs.shoot_at if inputs.shoot_at is not None else (0, 0)
+        self.unacknowledged[self.sequence] = time.perf_counter()
+        send_message(self.sock, INPUT.pack(self.sequence, input_flags(inputs), int(x), int(y)))
+
+    def read_welcome(self):
+        magic, version, self.player_index = WELCOME.unpack(self.next_message())
+        if magic != NET_MAGIC:
+            raise ValueError("not a co-op server")
+        if version != NET_VERSION:
+            raise ValueError(f"server uses protocol version {version}, expected {NET_VERSION}")
+
+    def receive(self):
+        """wait for the next snapshot and apply it, returning its tick."""
+        if self.player_index is None:
+            self.read_welcome()
+        message = self.next_message()
+        (tick, acknowledged, self.player_index, self.game_over,
+         *counts) = SNAPSHOT.unpack_from(message)
+        self.tables = decode_tables(message[SNAPSHOT.size:], dict(zip(TABLES, counts)),
+                                    self.tables)
+        self.tick = tick
+
+        now = time.perf_counter()
+        for sequence in [s for s in self.unacknowledged if s <= acknowledged]:
+            self.latencies.append(now - self.unacknowledged.pop(sequence))
+        return tick
+
+    def positions(self, table):
+        """return the (x, y) world positions of everything in a table, to within a step."""
+        columns = self.tables[table]
+        return dequantize_positions(columns["x"]), dequantize_positions(columns["y"])
+
+    def close(self):
+        self.sock.close()
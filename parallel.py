@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import app
+
+
+def chunk_bounds(count, chunks):
+    """split range(count) into `chunks` contiguous (start, end) pairs of near equal size."""
+    chunks = max(1, min(chunks, count))
+    size, extra = divmod(count, chunks)
+    bounds = []
+    start = 0
+    for i in range(chunks):
+        end = start + size + (1 if i < extra else 0)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+class ChunkPool:
+    def __init__(self, workers=app.UPDATE_WORKERS, min_chunk=app.UPDATE_MIN_CHUNK):
+        """run work over chunks of an array on a pool of threads.
+
+        numpy lets go of the GIL while it works on large arrays, so chunks of a
+        batched update really do run at the same time. ranges smaller than
+        `min_chunk` items per worker are split into fewer chunks.
+        """
+        self.workers = workers
+        self.min_chunk = min_chunk
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def shutdown(self):
+        """stop the worker threads."""
+        self.executor.shutdown(wait=True)
+
+    def map(self, function, count):
+        """call function(start, end) for each chunk of range(count).
+
+        the results come back in chunk order whichever finishes first, so
+        merging them gives the same answer every run.
+        """
+        chunks = min(self.workers, count // self.min_chunk)
+        if chunks <= 1:
+            return [function(0, count)]
+        futures = [
+            self.executor.submit(function, start, end)
+            for start, end in chunk_bounds(count, chunks)
+        ]
+        return [future.result() for future in futures]
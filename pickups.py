@@ -0,0 +1,141 @@
+import numpy as np
+
+import app
+from camera import in_view, to_pixels
+from coin import coin_size, get_coin_image
+from powerup import POWERUP_SIZE, POWERUP_TYPES, get_powerup_image
+
+# the kind column is 0 for coins, or 1 + the index into POWERUP_TYPES
+KIND_COIN = 0
+
+
+class PickupField:
+    def __init__(self, capacity=app.MAX_PICKUPS):
+        """coins and powerups lying on the floor, stored in parallel arrays.
+
+        live pickups are packed at the front in the order they were dropped, so
+        the oldest one is always first. when the field is full the oldest pickup
+        is dropped to make room.
+        """
+        self.capacity = capacity
+        self.count = 0
+        self.x = np.zeros(capacity, dtype=np.float64)
+        self.y = np.zeros(capacity, dtype=np.float64)
+        self.kind = np.zeros(capacity, dtype=np.int8)
+        self.value = np.zeros(capacity, dtype=np.int32)
+        self.size = np.zeros(capacity, dtype=np.int32)
+        self.expires = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        """remove every pickup."""
+        self.count = 0
+
+    def compact(self, keep):
+        """keep only the pickups where `keep` is true, preserving their order."""
+        n = self.count
+        kept = int(np.count_nonzero(keep))
+        if kept == n:
+            return
+        for array in (self.x, self.y, self.kind, self.value, self.size, self.expires):
+            array[:kept] = array[:n][keep]
+        self.count = kept
+
+    def remove(self, indices):
+        """remove the pickups at the given indices."""
+        keep = np.ones(self.count, dtype=bool)
+        keep[indices] = False
+        self.compact(keep)
+
+    def add(self, x, y, kind, value, size, tick):
+        """store a new pickup, dropping the oldest one if the field is full."""
+        if self.count == self.capacity:
+            self.remove([0])
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.kind[i] = kind
+        self.value[i] = value
+        self.size[i] = size
+        self.expires[i] = tick + app.PICKUP_LIFETIME
+        self.count += 1
+
+    def add_coin(self, x, y, tick, value=1):
+        """drop a coin, merging it into a coin stack nearby if there is one."""
+        n = self.count
+        if n:
+            dx = self.x[:n] - x
+            dy = self.y[:n] - y
+            near = (self.kind[:n] == KIND_COIN) & (
+                dx * dx + dy * dy <= app.COIN_MERGE_RADIUS * app.COIN_MERGE_RADIUS
+            )
+            nearby = np.flatnonzero(near)
+            if len(nearby):
+                # add to the closest stack and give it a fresh lifetime
+                i = nearby[np.argmin(dx[nearby] ** 2 + dy[nearby] ** 2)]
+                self.value[i] += value
+                self.size[i] = coin_size(int(self.value[i]))
+                self.expires[i] = tick + app.PICKUP_LIFETIME
+                return
+        self.add(x, y, KIND_COIN, value, coin_size(value), tick)
+
+    def add_powerup(self, x, y, powerup_type, tick):
+        """drop a powerup of the given type."""
+        kind = 1 + POWERUP_TYPES.index(powerup_type)
+        self.add(x, y, kind, 1, POWERUP_SIZE, tick)
+
+    def expire(self, tick):
+        """remove every pickup whose time on the floor has run out."""
+        n = self.count
+        if n:
+            self.compact(self.expires[:n] > tick)
+
+    def colliding(self, rect, coins=True):
+        """return the indices of the coins (or powerups) overlapping a rectangle."""
+        n = self.count
+        if n == 0:
+            return np.empty(0, dtype=np.intp)
+        # same overlap test as Rect.colliderect for a square centred on (x, y)
+        size = self.size[:n]
+        left = to_pixels(self.x[:n]) - size // 2
+        top = to_pixels(self.y[:n]) - size // 2
+        hit = (
+            (left < rect.right) & (left + size > rect.left)
+            & (top < rect.bottom) & (top + size > rect.top)
+        )
+        if coins:
+            hit &= self.kind[:n] == KIND_COIN
+        else:
+            hit &= self.kind[:n] != KIND_COIN
+        return np.flatnonzero(hit)
+
+    def render_items(self, view=None):
+        """return an (image, top left) pair for every pickup, for drawing in a batch.
+
+        with a view (a Rect in world coordinates) only the pickups near it are
+        returned, placed relative to its top left.
+        """
+        n = self.count
+        if n == 0:
+            return []
+        shown = slice(0, n)
+        offset_x = offset_y = 0
+        if view is not None:
+            shown = np.flatnonzero(in_view(self.x[:n], self.y[:n], view))
+            offset_x, offset_y = view.topleft
+        x = self.x[shown]
+        y = self.y[shown]
+        size = self.size[shown]
+        left = to_pixels(x) - size // 2 - offset_x
+        top = to_pixels(y) - size // 2 - offset_y
+        items = []
+        for kind, value, l, t in zip(self.kind[shown].tolist(), self.value[shown].tolist(),
+                                     left.tolist(), top.tolist()):
+            if kind == KIND_COIN:
+                image = get_coin_image(value)
+            else:
+                image = get_powerup_image(POWERUP_TYPES[kind - 1])
+            items.append((image, (l, t)))
+        return items
@@ -1,7 +1,9 @@
 import math
+import numpy as np
 import pygame
 import app  # contains global settings like WIDTH, HEIGHT, PLAYER_SPEED, etc.
-from bullet import Bullet
+from bullet import BulletPool
+from inputs import TickInput
 
 class Player:
     def __init__(self, x, y, assets):
@@ -9,11 +11,16 @@ class Player:
         # store the player's x and y position on the screen
         self.x = x
         self.y = y
+        # the position at the start of the tick, for drawing between ticks
+        self.prev_x = x
+        self.prev_y = y
 
         # set the player's speed using a global setting from the app module
         self.speed = app.PLAYER_SPEED
         # load player animations from the provided assets
         self.animations = assets["player"]
+        # left-facing copies of the same animations
+        self.flipped_animations = assets["player_flipped"]
         # set the player's initial state to idle (not moving)
         self.state = "idle"
         # initialise the frame index for animation (starts at first frame)
@@ -27,6 +34,9 @@ class Player:
         self.xp = 0
         # set the player's starting health
         self.health = 5
+        # a spectator is in the game but not playing it, like the host of a
+        # dedicated co-op server. it never moves, gets hit or gets chased
+        self.spectator = False
 
         # set bullet speed and size
         self.bullet_speed = 10
@@ -37,41 +47,48 @@ class Player:
         self.shoot_cooldown = 20
         # initialise the shoot timer to 0
         self.shoot_timer = 0
-        # initialise the list to store bullets
-        self.bullets = []
+        # preallocated pool holding every live bullet
+        self.bullets = BulletPool()
 
         # set the player's image to the first frame of the idle animation
         self.image = self.animations[self.state][self.frame_index]
+        # the same frame facing left
+        self.flipped_image = self.flipped_animations[self.state][self.frame_index]
         # create a collision rectangle based on the player's image
         self.rect = self.image.get_rect(center=(self.x, self.y))
         # assume the player is facing right by default
         self.facing_left = False
 
-    def handle_input(self):
-        """check and respond to keyboard/mouse input."""
-        # get all keys currently pressed on the keyboard
-        keys = pygame.key.get_pressed()
+    def handle_input(self, inputs=None):
+        """respond to this tick's input, polling the keyboard if none is given."""
+        if inputs is None:
+            # get all keys currently pressed on the keyboard
+            inputs = TickInput.from_keys(pygame.key.get_pressed())
+
+        # remember where this tick started
+        self.prev_x = self.x
+        self.prev_y = self.y
 
         # initialise velocity in both x and y directions to 0
         vel_x, vel_y = 0, 0
 
         # check for movement inputs (arrow keys) and update velocity
-        if keys[pygame.K_LEFT]:
+        if inputs.left:
             vel_x -= self.speed  # move left
-        if keys[pygame.K_RIGHT]:
+        if inputs.right:
             vel_x += self.speed  # move right
-        if keys[pygame.K_UP]:
+        if inputs.up:
             vel_y -= self.speed  # move up
-        if keys[pygame.K_DOWN]:
+        if inputs.down:
             vel_y += self.speed  # move down
 
         # update the player's x and y position based on velocity
         self.x += vel_x
         self.y += vel_y
 
-        # clamp the player's position to stay within screen bounds
-        self.x = max(0, min(self.x, app.WIDTH))
-        self.y = max(0, min(self.y, app.HEIGHT))
+        # clamp the player's position to stay within the world
+        self.x = max(0, min(self.x, app.WORLD_WIDTH))
+        self.y = max(0, min(self.y, app.WORLD_HEIGHT))
         # update the collision rectangle with the new position
         self.rect.center = (self.x, self.y)
 
@@ -93,13 +110,22 @@ class Player:
         if self.shoot_timer >= self.shoot_cooldown:
             return  # prevent shooting if cooldown hasn't passed
 
+        if self.fire_volley(tx, ty, self.bullet_count):
+            # reset the shoot timer after shooting
+            self.shoot_timer = 0
+
+    def fire_volley(self, tx, ty, bullet_count):
+        """fire a fan of `bullet_count` bullets centred on a position.
+
+        returns False without firing if the position is the player's own.
+        """
         # calculate the difference in x and y between the target and player
         dx = tx - self.x
         dy = ty - self.y
         # calculate the distance to the target
         dist = math.sqrt(dx**2 + dy**2)
         if dist == 0:
-            return  # do nothing if distance is zero (player and target at the same position)
+            return False  # do nothing if distance is zero (player and target at the same position)
 
         # calculate the velocity of the bullet in the x and y directions
         vx = (dx / dist) * self.bullet_speed
@@ -108,24 +134,19 @@ class Player:
         # set the spread angle for multiple bullets
         angle_spread = 10
         base_angle = math.atan2(vy, vx)  # calculate the base angle of the bullet
-        mid = (self.bullet_count - 1) / 2  # find the middle bullet if firing multiple bullets
-
-        # loop to fire multiple bullets if bullet_count > 1
-        for i in range(self.bullet_count):
-            offset = i - mid  # calculate the offset for each bullet
-            spread_radians = math.radians(angle_spread * offset)  # convert spread angle to radians
-            angle = base_angle + spread_radians  # adjust the bullet's angle
-
-            # calculate the final x and y velocities after applying spread
-            final_vx = math.cos(angle) * self.bullet_speed
-            final_vy = math.sin(angle) * self.bullet_speed
-
-            # create a new bullet with the calculated velocity and size
-            bullet = Bullet(self.x, self.y, final_vx, final_vy, self.bullet_size)
-            # add the bullet to the list of bullets
-            self.bullets.append(bullet)
-        # reset the shoot timer after shooting
-        self.shoot_timer = 0
+        mid = (bullet_count - 1) / 2  # find the middle bullet if firing multiple bullets
+
+        # offset each bullet of the volley from the middle one by the spread angle
+        offsets = np.arange(bullet_count) - mid
+        angles = base_angle + np.radians(angle_spread * offsets)
+
+        # calculate the final x and y velocities after applying spread
+        final_vx = np.cos(angles) * self.bullet_speed
+        final_vy = np.sin(angles) * self.bullet_speed
+
+        # add the whole volley to the bullet pool at once
+        self.bullets.spawn(self.x, self.y, final_vx, final_vy, self.bullet_size)
+        return True
 
     def shoot_toward_mouse(self, pos):
         """shoot towards the mouse position."""
@@ -138,14 +159,29 @@ class Player:
         # call shoot_toward_position with the enemy's position
         self.shoot_toward_position(enemy.x, enemy.y)
 
-    def update(self):
-        """update player state."""
-        # update each bullet in the bullets list
-        for bullet in self.bullets:
-            bullet.update()  # update the bullet's position
-            # remove the bullet if it goes off-screen
-            if bullet.y < 0 or bullet.y > app.HEIGHT or bullet.x < 0 or bullet.x > app.WIDTH:
-                self.bullets.remove(bullet)
+    def shoot_toward_enemies(self, enemies):
+        """split one volley between several enemies, the nearest getting any extra bullets."""
+        if len(enemies) == 1:
+            self.shoot_toward_enemy(enemies[0])
+            return
+
+        # check if the shoot cooldown has passed
+        if self.shoot_timer >= self.shoot_cooldown:
+            return
+
+        share, extra = divmod(self.bullet_count, len(enemies))
+        fired = False
+        for i, enemy in enumerate(enemies):
+            count = share + (1 if i < extra else 0)
+            if count and self.fire_volley(enemy.x, enemy.y, count):
+                fired = True
+        if fired:
+            self.shoot_timer = 0
+
+    def update(self, view=None):
+        """update player state, `view` being the part of the world on screen."""
+        # move every bullet and remove the ones that went off-screen
+        self.bullets.update(view)
 
         # increment the animation timer
         self.animation_timer += 1
@@ -156,23 +192,31 @@ class Player:
             self.frame_index = (self.frame_index + 1) % len(frames)  # cycle through animation frames
             # set the current frame as the player's image
             self.image = frames[self.frame_index]
+            self.flipped_image = self.flipped_animations[self.state][self.frame_index]
             # update the collision rectangle to match the new image
             center = self.rect.center
             self.rect = self.image.get_rect()
             self.rect.center = center
 
+    def render_item(self, alpha=1.0):
+        """return the (image, position) pair used to draw the player in a batch.
+
+        alpha places the player between its previous (0) and current (1) tick position.
+        """
+        # use the pre-flipped frame if facing left
+        image = self.flipped_image if self.facing_left else self.image
+        if alpha == 1.0:
+            return image, self.rect
+        x = self.prev_x + (self.x - self.prev_x) * alpha
+        y = self.prev_y + (self.y - self.prev_y) * alpha
+        return image, image.get_rect(center=(x, y))
+
     def draw(self, surface):
         """draw the player on the screen."""
-        # flip the player's image if facing left
-        if self.facing_left:
-            flipped_img = pygame.transform.flip(self.image, True, False)
-            surface.blit(flipped_img, self.rect)  # draw the flipped image
-        else:
-            surface.blit(self.image, self.rect)  # draw the normal image
+        surface.blit(*self.render_item())
 
         # draw all the bullets on the screen
-        for bullet in self.bullets:
-            bullet.draw(surface)
+        self.bullets.draw(surface)
 
     def take_damage(self, amount):
         """reduce the player's health by a given amount, not going below zero."""
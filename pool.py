@@ -0,0 +1,32 @@
+class ObjectPool:
+    def __init__(self, factory, prewarm=0, *prewarm_args):
+        """keep released objects around so they can be handed out again.
+
+        factory(*args) creates a new object when the pool is empty. objects
+        handed out again have reset(*args) called on them instead, so they
+        must have a reset() method taking the same arguments as the factory.
+        """
+        self.factory = factory
+        self.free = []
+        if prewarm:
+            self.prewarm(prewarm, *prewarm_args)
+
+    def __len__(self):
+        return len(self.free)
+
+    def prewarm(self, count, *args):
+        """create objects up front until `count` are waiting in the pool."""
+        while len(self.free) < count:
+            self.free.append(self.factory(*args))
+
+    def acquire(self, *args):
+        """return a pooled object reset with `args`, or a new one if none are free."""
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args)
+            return obj
+        return self.factory(*args)
+
+    def release(self, obj):
+        """hand an object back to the pool once the game is done with it."""
+        self.free.append(obj)
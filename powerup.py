@@ -1,25 +1,27 @@
 import app
 
-class Powerup:
-    def __init__(self, x, y, powerup_type):
-        # define initial position of the powerup
-        self.x = x
-        self.y = y
-        
-        # create an image for the powerup with transparent background
-        self.image = app.pygame.Surface((15, 15), app.pygame.SRCALPHA)
-        
-        # make the powerups different colours depending on the buff it gives
-        if powerup_type == "speed_boost": 
-            self.image.fill((0, 255, 0))  # green for speed boost
-        elif powerup_type == "speed_up_bullets":     
-            self.image.fill((0, 0, 255))  # blue for speeding up bullets
-        else:                             # more bullets
-            self.image.fill((255, 0, 0)) # red for more bullets powerup
-        
-        # create a rect to track the powerup's position
-        self.rect = self.image.get_rect(center=(self.x, self.y))
+# every kind of powerup, in the order they are numbered in the pickup field
+POWERUP_TYPES = ["speed_boost", "speed_up_bullets", "more_bullets"]
+
+# make the powerups different colours depending on the buff it gives
+POWERUP_COLOURS = {
+    "speed_boost": (0, 255, 0),         # green for speed boost
+    "speed_up_bullets": (0, 0, 255),    # blue for speeding up bullets
+    "more_bullets": (255, 0, 0),        # red for more bullets powerup
+}
+
+POWERUP_SIZE = 15
 
-    def draw(self, surface):
-        # draw the powerup image on the given surface
-        surface.blit(self.image, self.rect)
\ No newline at end of file
+# one shared image per powerup type, created the first time it's needed
+powerup_images = {}
+
+
+def get_powerup_image(powerup_type):
+    """return the cached image for a powerup of the given type."""
+    image = powerup_images.get(powerup_type)
+    if image is None:
+        # create an image for the powerup with transparent background
+        image = app.pygame.Surface((POWERUP_SIZE, POWERUP_SIZE), app.pygame.SRCALPHA)
+        image.fill(POWERUP_COLOURS[powerup_type])
+        powerup_images[powerup_type] = image
+    return image
@@ -0,0 +1,125 @@
+import csv
+import json
+import time
+from collections import deque
+from contextlib import nullcontext
+
+import numpy as np
+
+import app
+
+
+class Section:
+    def __init__(self, profiler, name):
+        """times one named stage of a frame, used as a `with` block."""
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter_ns() - self.start
+        timings = self.profiler.current
+        timings[self.name] = timings.get(self.name, 0) + elapsed
+        return False
+
+
+class FrameProfiler:
+    def __init__(self, window=app.PROFILER_WINDOW, keep_all=False):
+        """collect per-stage timings for each frame.
+
+        rolling percentiles are computed over the last `window` frames. with
+        keep_all every frame's timings are also kept so they can be exported.
+        """
+        self.enabled = True
+        self.window = window
+        self.keep_all = keep_all
+
+        # stage names in the order they were first seen, for stable output
+        self.names = []
+        self.sections = {}
+        self.history = {}
+        self.frames = []
+
+        self.current = {}
+        self.frame_start = 0
+        self.null_section = nullcontext()
+
+    def section(self, name):
+        """return a context manager that adds its run time to stage `name`."""
+        if not self.enabled:
+            return self.null_section
+        section = self.sections.get(name)
+        if section is None:
+            section = Section(self, name)
+            self.sections[name] = section
+        return section
+
+    def begin_frame(self):
+        self.current = {}
+        self.frame_start = time.perf_counter_ns()
+
+    def record(self, name, nanoseconds):
+        """store a time measured outside a section, such as a latency, for this frame."""
+        if self.enabled:
+            self.current[name] = nanoseconds
+
+    def end_frame(self):
+        """store the finished frame's timings."""
+        if not self.enabled:
+            return
+        timings = self.current
+        timings["frame"] = time.perf_counter_ns() - self.frame_start
+
+        for name, elapsed in timings.items():
+            history = self.history.get(name)
+            if history is None:
+                history = deque(maxlen=self.window)
+                self.history[name] = history
+                self.names.append(name)
+            history.append(elapsed)
+
+        if self.keep_all:
+            self.frames.append(timings)
+
+    def percentiles(self, name):
+        """return the (p50, p95, p99) time of a stage in milliseconds over the window."""
+        history = self.history.get(name)
+        if not history:
+            return (0.0, 0.0, 0.0)
+        p50, p95, p99 = np.percentile(np.fromiter(history, dtype=np.int64), (50, 95, 99))
+        return (p50 / 1e6, p95 / 1e6, p99 / 1e6)
+
+    def summary_lines(self):
+        """return one line of text per stage with its rolling percentiles."""
+        lines = [f"{'stage':<16}{'p50':>7}{'p95':>7}{'p99':>7}"]
+        for name in self.names:
+            p50, p95, p99 = self.percentiles(name)
+            lines.append(f"{name:<16}{p50:>7.2f}{p95:>7.2f}{p99:>7.2f}")
+        return lines
+
+    def draw_overlay(self, surface, font, dest=(10, 100)):
+        """draw the percentile table onto `surface` (milliseconds)."""
+        x, y = dest
+        for line in self.summary_lines():
+            text = font.render(line, True, (255, 255, 0), (0, 0, 0))
+            surface.blit(text, (x, y))
+            y += text.get_height()
+
+    def export(self, path):
+        """write every kept frame's timings (in milliseconds) to a .csv or .json file."""
+        rows = [
+            {name: frame.get(name, 0) / 1e6 for name in self.names}
+            for frame in self.frames
+        ]
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({"stages": self.names, "frames": rows}, f)
+        else:
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=self.names)
+                writer.writeheader()
+                writer.writerows(rows)
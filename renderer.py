@@ -0,0 +1,142 @@
+import pygame
+
+import app
+
+
+def coalesce_rects(rects):
+    """merge overlapping rectangles so no screen area is pushed twice."""
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        if not rect.width or not rect.height:
+            continue
+        # keep absorbing merged rects until the union stops overlapping any of them
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
+class RenderQueue:
+    def __init__(self):
+        """collects (image, position) pairs over a frame and draws them all at once."""
+        # layer number -> list of (image, position) pairs
+        self.layers = {}
+
+    def add(self, layer, image, dest):
+        """queue one image to be drawn on the given layer."""
+        self.layers.setdefault(layer, []).append((image, dest))
+
+    def extend(self, layer, items):
+        """queue many (image, position) pairs on the given layer."""
+        self.layers.setdefault(layer, []).extend(items)
+
+    def flush(self, target):
+        """draw everything queued onto `target` in one blits call, lowest layer first."""
+        batch = []
+        for layer in sorted(self.layers):
+            batch.extend(self.layers[layer])
+        self.layers.clear()
+        if batch:
+            target.blits(batch, doreturn=False)
+
+
+class DirtyRectRenderer:
+    def __init__(self, screen, background, mode=app.RENDER_MODE):
+        """draw onto `screen`, only pushing the areas that changed each frame.
+
+        it has the same blit()/blits() methods as a Surface, so anything that
+        draws itself onto a surface can draw onto the renderer instead. in
+        "flip" mode it redraws the whole background and flips every frame.
+        """
+        if mode not in ("dirty", "flip"):
+            raise ValueError(f"unknown render mode: {mode!r}")
+        self.screen = screen
+        self.background = background
+        self.mode = mode
+
+        # screen areas drawn over during the previous and current frame
+        self.previous_rects = []
+        self.current_rects = []
+
+        # the first frame always needs the whole screen drawn
+        self.full_redraw = True
+        # set when the screen was scrolled, every pixel moved so all of it is pushed
+        self.scrolled = False
+
+    def invalidate(self):
+        """redraw and push the whole screen on the next frame."""
+        self.full_redraw = True
+
+    def scroll(self, dx, dy):
+        """move the screen and background by (dx, dy) pixels, for a camera move.
+
+        last frame is kept, only shifted, so just the strips along the edges
+        that scrolled into view need drawing. they are returned as a list of
+        rects, and the caller draws them onto the background before the next
+        begin_frame(). returns None when there is nothing worth keeping (in
+        flip mode, before a full redraw, or moving a whole screen or more),
+        and the whole screen is redrawn as after invalidate().
+        """
+        width, height = self.screen.get_size()
+        if (self.mode == "flip" or self.full_redraw
+                or abs(dx) >= width or abs(dy) >= height):
+            self.invalidate()
+            return None
+
+        self.screen.scroll(dx, dy)
+        self.background.scroll(dx, dy)
+        strips = []
+        if dx > 0:
+            strips.append(pygame.Rect(0, 0, dx, height))
+        elif dx < 0:
+            strips.append(pygame.Rect(width + dx, 0, -dx, height))
+        if dy > 0:
+            strips.append(pygame.Rect(0, 0, width, dy))
+        elif dy < 0:
+            strips.append(pygame.Rect(0, height + dy, width, -dy))
+
+        # last frame's sprites moved with the screen, so erase them where they
+        # ended up, along with the strips
+        self.previous_rects = [rect.move(dx, dy) for rect in self.previous_rects] + strips
+        self.scrolled = True
+        return strips
+
+    def begin_frame(self):
+        """erase last frame's sprites by restoring the background under them."""
+        if self.full_redraw or self.mode == "flip":
+            self.screen.blit(self.background, (0, 0))
+        else:
+            for rect in self.previous_rects:
+                self.screen.blit(self.background, rect, rect)
+
+    def blit(self, image, dest, area=None):
+        """draw an image onto the screen and remember the area it covered."""
+        rect = self.screen.blit(image, dest, area)
+        self.current_rects.append(rect)
+        return rect
+
+    def blits(self, blit_sequence, doreturn=True):
+        """draw many images at once, like Surface.blits."""
+        rects = self.screen.blits(blit_sequence, doreturn=True)
+        self.current_rects.extend(rects)
+        return rects if doreturn else None
+
+    def end_frame(self):
+        """push this frame to the display."""
+        if self.full_redraw or self.scrolled or self.mode == "flip":
+            pygame.display.flip()
+        else:
+            dirty = self.previous_rects + self.current_rects
+            if len(dirty) > app.DIRTY_RECT_LIMIT:
+                # merging this many rects costs more than pushing the whole screen
+                pygame.display.flip()
+            else:
+                pygame.display.update(coalesce_rects(dirty))
+
+        self.previous_rects = self.current_rects
+        self.current_rects = []
+        self.full_redraw = False
+        self.scrolled = False
@@ -0,0 +1,158 @@
+import struct
+
+from inputs import TickInput
+
+# a replay file starts with a header holding the format version, game seed and
+# enemy backend (an index into BACKENDS), followed by one record per run of identical ticks:
+#   flags (1 byte), run length (1 byte)                    no shot position
+#   flags (1 byte), x (2 bytes), y (2 bytes)               shooting at a position
+REPLAY_MAGIC = b"SHRP"
+REPLAY_VERSION = 2
+HEADER = struct.Struct("<4sBQB")
+RUN_RECORD = struct.Struct("<BB")
+AIM_RECORD = struct.Struct("<Bhh")
+
+FLAG_LEFT = 1 << 0
+FLAG_RIGHT = 1 << 1
+FLAG_UP = 1 << 2
+FLAG_DOWN = 1 << 3
+FLAG_SHOOT_NEAREST = 1 << 4
+FLAG_SHOOT_AT = 1 << 5
+FLAG_RESET = 1 << 6
+
+MAX_RUN = 255
+
+# the two backends round differently enough that a replay has to be re-run
+# on the one it was recorded with
+BACKENDS = ("objects", "numpy")
+
+
+def input_flags(inputs):
+    """pack the boolean parts of a TickInput into one byte."""
+    flags = 0
+    if inputs.left:
+        flags |= FLAG_LEFT
+    if inputs.right:
+        flags |= FLAG_RIGHT
+    if inputs.up:
+        flags |= FLAG_UP
+    if inputs.down:
+        flags |= FLAG_DOWN
+    if inputs.shoot_nearest:
+        flags |= FLAG_SHOOT_NEAREST
+    if inputs.shoot_at is not None:
+        flags |= FLAG_SHOOT_AT
+    if inputs.reset:
+        flags |= FLAG_RESET
+    return flags
+
+
+def flags_to_input(flags, shoot_at=None):
+    """unpack a flags byte back into a TickInput."""
+    return TickInput(
+        left=bool(flags & FLAG_LEFT),
+        right=bool(flags & FLAG_RIGHT),
+        up=bool(flags & FLAG_UP),
+        down=bool(flags & FLAG_DOWN),
+        shoot_nearest=bool(flags & FLAG_SHOOT_NEAREST),
+        shoot_at=shoot_at,
+        reset=bool(flags & FLAG_RESET),
+    )
+
+
+class InputRecorder:
+    def __init__(self, path, seed, backend):
+        """start a replay file at `path` for a game created with `seed` and enemy `backend`."""
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, seed, BACKENDS.index(backend)))
+
+        # ticks with the same flags are written as a single run
+        self.run_flags = None
+        self.run_length = 0
+
+    def record(self, inputs):
+        """log one tick's input."""
+        flags = input_flags(inputs)
+        if inputs.shoot_at is not None:
+            self.flush_run()
+            x, y = inputs.shoot_at
+            self.file.write(AIM_RECORD.pack(flags, x, y))
+            return
+
+        if flags != self.run_flags or self.run_length == MAX_RUN:
+            self.flush_run()
+            self.run_flags = flags
+        self.run_length += 1
+
+    def flush_run(self):
+        """write out the current run of identical ticks, if there is one."""
+        if self.run_length:
+            self.file.write(RUN_RECORD.pack(self.run_flags, self.run_length))
+        self.run_flags = None
+        self.run_length = 0
+
+    def close(self):
+        """finish the file."""
+        self.flush_run()
+        self.file.close()
+
+
+def read_replay(path):
+    """return (seed, backend, inputs) from a replay file, with one TickInput per tick."""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    magic, version, seed, backend = HEADER.unpack_from(data, 0)
+    if magic != REPLAY_MAGIC:
+        raise ValueError(f"{path} is not a replay file")
+    if version != REPLAY_VERSION:
+        raise ValueError(f"{path} uses replay version {version}, expected {REPLAY_VERSION}")
+
+    inputs = []
+    offset = HEADER.size
+    while offset < len(data):
+        flags = data[offset]
+        if flags & FLAG_SHOOT_AT:
+            flags, x, y = AIM_RECORD.unpack_from(data, offset)
+            offset += AIM_RECORD.size
+            inputs.append(flags_to_input(flags, (x, y)))
+        else:
+            flags, run = RUN_RECORD.unpack_from(data, offset)
+            offset += RUN_RECORD.size
+            tick_input = flags_to_input(flags)
+            # the game never changes a TickInput, so a run can share one object
+            inputs.extend([tick_input] * run)
+    return seed, BACKENDS[backend], inputs
+
+
+def run_replay(path, checksum_path=None, verify_path=None):
+    """re-run a recorded session headlessly at full speed.
+
+    if checksum_path is given, the state checksum after every tick is written
+    there. if verify_path is given, the checksums are compared against that
+    file and the first tick that differs is returned (None if they all match).
+    """
+    from game import Game
+
+    seed, backend, inputs = read_replay(path)
+    game = Game(enemy_backend=backend, headless=True, seed=seed)
+
+    checksums = []
+    for tick_input in inputs:
+        game.step(tick_input)
+        checksums.append(game.state_checksum())
+
+    if checksum_path:
+        with open(checksum_path, "wb") as f:
+            f.write(struct.pack(f"<{len(checksums)}I", *checksums))
+
+    if verify_path:
+        with open(verify_path, "rb") as f:
+            data = f.read()
+        expected = struct.unpack(f"<{len(data) // 4}I", data)
+        for tick, (got, want) in enumerate(zip(checksums, expected)):
+            if got != want:
+                return tick
+        if len(checksums) != len(expected):
+            return min(len(checksums), len(expected))
+    return None
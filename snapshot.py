@@ -0,0 +1,245 @@
+import struct
+from collections import deque
+from itertools import chain
+from operator import attrgetter
+
+import numpy as np
+
+import app
+from horde import FIELDS
+from powerup import POWERUP_TYPES
+
+# reads every field of an Enemy at once, in FIELDS order
+ENEMY_STATE = attrgetter(*FIELDS)
+
+# a snapshot is a header, then the fixed-size game, random generator and wave
+# director state, then the player count and each player's state followed by
+# their bullets, then the pickups and enemies. bullets, pickups and enemies
+# are one block of raw array bytes per field, each preceded by its entity count
+SNAPSHOT_MAGIC = b"SHSS"
+SNAPSHOT_VERSION = 2
+HEADER = struct.Struct("<4sBQQ")
+GAME_STATE = struct.Struct("<q?B")
+RNG_STATE = struct.Struct("<625I?d")
+DIRECTOR_STATE = struct.Struct("<iiiiddd")
+PLAYER_STATE = struct.Struct("<ddddddiiiiiiiBB?")
+COUNT = struct.Struct("<I")
+
+BULLET_FIELDS = {"x": np.float64, "y": np.float64, "vx": np.float64, "vy": np.float64,
+                 "size": np.int32}
+PICKUP_FIELDS = {"x": np.float64, "y": np.float64, "kind": np.int8, "value": np.int32,
+                 "size": np.int32, "expires": np.int64}
+
+
+def pack_arrays(count, arrays, fields):
+    """pack the first `count` entries of each field's array."""
+    parts = [COUNT.pack(count)]
+    for name, dtype in fields.items():
+        parts.append(np.ascontiguousarray(arrays[name][:count], dtype=dtype).tobytes())
+    return parts
+
+
+def unpack_arrays(data, offset, fields):
+    """read arrays written by pack_arrays(), returning (count, arrays, new offset)."""
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    arrays = {}
+    for name, dtype in fields.items():
+        arrays[name] = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += arrays[name].nbytes
+    return count, arrays, offset
+
+
+def enemy_arrays(game):
+    """return the enemies' state as field name -> array, for either backend."""
+    enemies = game.enemies
+    if game.enemy_backend == "numpy":
+        return {name: getattr(enemies, name) for name in FIELDS}
+    # one pass over the enemies into a table with a row per enemy, every
+    # field fits exactly in a float64, then a column per field
+    values = chain.from_iterable(map(ENEMY_STATE, enemies))
+    table = np.fromiter(values, dtype=np.float64, count=len(enemies) * len(FIELDS))
+    table = table.reshape(len(enemies), len(FIELDS))
+    return {name: table[:, i].astype(dtype) for i, (name, dtype) in enumerate(FIELDS.items())}
+
+
+def pack_player(player):
+    """return the state of one player and their bullets as a list of byte strings."""
+    animation_states = list(player.animations)
+    # the player's image only catches up with its state on the next animation frame
+    image_state = next(
+        state for state, frames in player.animations.items()
+        if player.frame_index < len(frames) and frames[player.frame_index] is player.image
+    )
+    bullets = player.bullets
+    parts = [
+        PLAYER_STATE.pack(
+            player.x, player.y, player.prev_x, player.prev_y, player.speed,
+            player.bullet_speed, player.health, player.xp, player.bullet_size,
+            player.bullet_count, player.shoot_timer, player.frame_index,
+            player.animation_timer, animation_states.index(player.state),
+            animation_states.index(image_state), player.facing_left,
+        ),
+    ]
+    parts += pack_arrays(bullets.count, vars(bullets), BULLET_FIELDS)
+    return parts
+
+
+def unpack_player(player, data, offset):
+    """put `player` back into the state written by pack_player(), returning the new offset."""
+    (player.x, player.y, player.prev_x, player.prev_y, player.speed,
+     player.bullet_speed, player.health, player.xp, player.bullet_size,
+     player.bullet_count, player.shoot_timer, player.frame_index,
+     player.animation_timer, state, image_state,
+     player.facing_left) = PLAYER_STATE.unpack_from(data, offset)
+    offset += PLAYER_STATE.size
+    animation_states = list(player.animations)
+    player.state = animation_states[state]
+    image_state = animation_states[image_state]
+    player.image = player.animations[image_state][player.frame_index]
+    player.flipped_image = player.flipped_animations[image_state][player.frame_index]
+    player.rect = player.image.get_rect(center=(player.x, player.y))
+
+    bullets = player.bullets
+    count, arrays, offset = unpack_arrays(data, offset, BULLET_FIELDS)
+    for name in BULLET_FIELDS:
+        getattr(bullets, name)[:count] = arrays[name]
+    bullets.count = count
+    return offset
+
+
+def save_state(game):
+    """return the whole simulation state of `game` as bytes.
+
+    images, sounds and anything else that can be rebuilt from the assets are
+    left out, so a snapshot only holds numbers.
+    """
+    director = game.director
+    version, mt_state, gauss_next = game.rng.getstate()
+    powerup = POWERUP_TYPES.index(game.powerup_effect) + 1 if game.powerup_effect else 0
+
+    pickups = game.pickups
+    parts = [
+        HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, game.seed, game.world.seed),
+        GAME_STATE.pack(game.ticks, game.game_over, powerup),
+        RNG_STATE.pack(*mt_state, gauss_next is not None, gauss_next or 0.0),
+        DIRECTOR_STATE.pack(
+            director.wave_index, director.cycle, director.wave_ticks, director.spawn_timer,
+            director.rate, director.credit, director.average_frame_time,
+        ),
+        COUNT.pack(len(game.players)),
+    ]
+    for player in game.players:
+        parts += pack_player(player)
+    parts += pack_arrays(pickups.count, vars(pickups), PICKUP_FIELDS)
+    parts += pack_arrays(len(game.enemies), enemy_arrays(game), FIELDS)
+    return b"".join(parts)
+
+
+def restore_state(game, data):
+    """put `game` back into the state saved in `data` by save_state().
+
+    co-op players are added or dropped from the end to match the snapshot.
+    """
+    magic, version, seed, world_seed = HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("not a snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"unsupported snapshot version {version}")
+    offset = HEADER.size
+
+    game.seed = seed
+    if game.world.seed != world_seed:
+        game.world.seed = world_seed
+        game.world.chunks.clear()
+    ticks, game_over, powerup = GAME_STATE.unpack_from(data, offset)
+    offset += GAME_STATE.size
+    game.ticks = ticks
+    game.game_over = game_over
+    game.powerup_effect = POWERUP_TYPES[powerup - 1] if powerup else ""
+
+    rng = RNG_STATE.unpack_from(data, offset)
+    offset += RNG_STATE.size
+    game.rng.setstate((3, rng[:625], rng[626] if rng[625] else None))
+
+    director = game.director
+    (director.wave_index, director.cycle, director.wave_ticks, director.spawn_timer,
+     director.rate, director.credit, director.average_frame_time) = DIRECTOR_STATE.unpack_from(
+        data, offset)
+    offset += DIRECTOR_STATE.size
+
+    (player_count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    while len(game.players) > player_count:
+        game.remove_player(game.players[-1])
+    while len(game.players) < player_count:
+        game.add_player()
+    for player in game.players:
+        offset = unpack_player(player, data, offset)
+
+    pickups = game.pickups
+    count, arrays, offset = unpack_arrays(data, offset, PICKUP_FIELDS)
+    for name in PICKUP_FIELDS:
+        getattr(pickups, name)[:count] = arrays[name]
+    pickups.count = count
+
+    count, arrays, offset = unpack_arrays(data, offset, FIELDS)
+    game.load_enemies(count, arrays)
+
+    # the camera and enemy grid are worked out from the restored positions
+    game.camera.follow(game.player.x, game.player.y)
+    game.rebuild_enemy_grid()
+    game.renderer.invalidate()
+
+
+class SnapshotRing:
+    def __init__(self, capacity=app.SNAPSHOT_RING_SIZE, interval=app.SNAPSHOT_INTERVAL):
+        """keep the last `capacity` snapshots, one taken every `interval` ticks."""
+        self.interval = interval
+        # (tick, snapshot bytes), oldest first
+        self.snapshots = deque(maxlen=capacity)
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def clear(self):
+        self.snapshots.clear()
+
+    def record(self, game):
+        """take a snapshot if one is due on this tick."""
+        if game.ticks % self.interval == 0:
+            self.snapshots.append((game.ticks, save_state(game)))
+
+    def latest(self):
+        """return the newest snapshot, or None if there isn't one yet."""
+        return self.snapshots[-1][1] if self.snapshots else None
+
+    def rewind(self, game, ticks):
+        """restore the newest snapshot at least `ticks` ticks old (or the oldest kept).
+
+        snapshots newer than the one restored are dropped. returns the tick
+        the game is now on, or None if there was nothing to rewind to.
+        """
+        if not self.snapshots:
+            return None
+        target = game.ticks - ticks
+        while len(self.snapshots) > 1 and self.snapshots[-1][0] > target:
+            self.snapshots.pop()
+        tick, data = self.snapshots[-1]
+        restore_state(game, data)
+        return tick
+
+    def dump(self, path):
+        """write the newest snapshot to a file, for looking into a crash."""
+        data = self.latest()
+        if data is None:
+            return False
+        with open(path, "wb") as f:
+            f.write(data)
+        return True
+
+
+def load_snapshot(game, path):
+    """restore `game` from a snapshot file written by SnapshotRing.dump()."""
+    with open(path, "rb") as f:
+        restore_state(game, f.read())
@@ -0,0 +1,290 @@
+import numpy as np
+
+import app
+
+
+class SpatialGrid:
+    def __init__(self, cell_size=app.GRID_CELL_SIZE):
+        """initialise an empty uniform grid with square cells of the given size.
+
+        each object is stored once, in the cell holding the centre of its rect.
+        queries widen their search area by the largest half-size seen so far, so
+        sprites bigger than a cell are still found without being stored twice.
+        """
+        self.cell_size = cell_size
+        # map each (cell_x, cell_y) key to the list of objects centred in that cell
+        self.cells = {}
+        # remember which cell each object was inserted into so it can be removed
+        self.object_cells = {}
+        # the largest half-width and half-height of anything inserted
+        self.max_half_w = 0
+        self.max_half_h = 0
+        # the range of occupied cell keys, used to stop nearest() searching
+        self.min_cell = None
+        self.max_cell = None
+
+    def __len__(self):
+        return len(self.object_cells)
+
+    def clear(self):
+        """remove every object from the grid."""
+        self.cells.clear()
+        self.object_cells.clear()
+        self.max_half_w = 0
+        self.max_half_h = 0
+        self.min_cell = None
+        self.max_cell = None
+
+    def extend_bounds(self, cx, cy):
+        """grow the range of occupied cells to include cell (cx, cy)."""
+        if self.min_cell is None:
+            self.min_cell = (cx, cy)
+            self.max_cell = (cx, cy)
+        else:
+            self.min_cell = (min(self.min_cell[0], cx), min(self.min_cell[1], cy))
+            self.max_cell = (max(self.max_cell[0], cx), max(self.max_cell[1], cy))
+
+    def insert(self, obj, rect=None):
+        """add an object to the cell containing the centre of its rect."""
+        if rect is None:
+            rect = obj.rect
+        cx, cy = rect.center
+        key = (cx // self.cell_size, cy // self.cell_size)
+        bucket = self.cells.get(key)
+        if bucket is None:
+            self.cells[key] = [obj]
+        else:
+            bucket.append(obj)
+        self.object_cells[id(obj)] = key
+        self.extend_bounds(*key)
+
+        # grow the query margin if this object is bigger than anything so far
+        if rect.width > 2 * self.max_half_w:
+            self.max_half_w = (rect.width + 1) // 2
+        if rect.height > 2 * self.max_half_h:
+            self.max_half_h = (rect.height + 1) // 2
+
+    def remove(self, obj):
+        """remove an object from the grid, doing nothing if it isn't in it."""
+        key = self.object_cells.pop(id(obj), None)
+        if key is None:
+            return
+        bucket = self.cells[key]
+        bucket.remove(obj)
+        if not bucket:
+            del self.cells[key]
+
+    def rebuild(self, objects):
+        """clear the grid and insert every object using its rect."""
+        self.clear()
+        size = self.cell_size
+        cells = self.cells
+        object_cells = self.object_cells
+        max_w = 0
+        max_h = 0
+
+        # same as calling insert() for each object, inlined because this runs every tick
+        for obj in objects:
+            rect = obj.rect
+            cx, cy = rect.center
+            key = (cx // size, cy // size)
+            bucket = cells.get(key)
+            if bucket is None:
+                cells[key] = [obj]
+            else:
+                bucket.append(obj)
+            object_cells[id(obj)] = key
+            if rect.width > max_w:
+                max_w = rect.width
+            if rect.height > max_h:
+                max_h = rect.height
+
+        self.max_half_w = (max_w + 1) // 2
+        self.max_half_h = (max_h + 1) // 2
+
+        if cells:
+            xs = [key[0] for key in cells]
+            ys = [key[1] for key in cells]
+            self.min_cell = (min(xs), min(ys))
+            self.max_cell = (max(xs), max(ys))
+
+    def rebuild_from_keys(self, objects, key_x, key_y, max_half_w, max_half_h):
+        """clear the grid and bucket objects[i] into cell (key_x[i], key_y[i]).
+
+        used when the cells were already worked out in bulk (see
+        EnemyHorde.cell_keys), the result is the same as rebuild() would give,
+        with each cell's objects in the order they appear in `objects`.
+        """
+        self.clear()
+        if not len(objects):
+            return
+        self.max_half_w = max_half_w
+        self.max_half_h = max_half_h
+
+        min_x = int(key_x.min())
+        min_y = int(key_y.min())
+        self.min_cell = (min_x, min_y)
+        self.max_cell = (int(key_x.max()), int(key_y.max()))
+
+        # sort by cell, keeping the original order within each cell, then cut
+        # the sorted list at every change of cell
+        rows = self.max_cell[1] - min_y + 1
+        cell_ids = (key_x - min_x) * rows + (key_y - min_y)
+        order = np.argsort(cell_ids, kind="stable")
+        sorted_ids = cell_ids[order]
+        changes = np.flatnonzero(sorted_ids[1:] != sorted_ids[:-1]) + 1
+        starts = [0] + changes.tolist()
+        ends = changes.tolist() + [len(order)]
+        sorted_objects = [objects[i] for i in order.tolist()]
+
+        cells = self.cells
+        object_cells = self.object_cells
+        for start, end, cell_id in zip(starts, ends, sorted_ids[starts].tolist()):
+            key = (min_x + cell_id // rows, min_y + cell_id % rows)
+            bucket = sorted_objects[start:end]
+            cells[key] = bucket
+            object_cells.update(dict.fromkeys(map(id, bucket), key))
+
+    def query(self, rect):
+        """return the objects in the cells near a rectangle.
+
+        these are only candidates, callers still need to test the actual rects.
+        """
+        size = self.cell_size
+        x0 = (rect.left - self.max_half_w) // size
+        y0 = (rect.top - self.max_half_h) // size
+        x1 = (rect.right + self.max_half_w) // size
+        y1 = (rect.bottom + self.max_half_h) // size
+
+        found = []
+        cells = self.cells
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is not None:
+                    found.extend(bucket)
+        return found
+
+    def nearest(self, x, y, k=1, radius=None):
+        """return up to `k` objects closest to (x, y), nearest first.
+
+        distances are measured to each object's x and y attributes and compared
+        squared. only objects within `radius` are returned, if it is given.
+        the search walks outwards one ring of cells at a time and stops once
+        no unvisited cell can hold anything closer than what was already found.
+        """
+        if self.min_cell is None or k <= 0:
+            return []
+        size = self.cell_size
+        px = int(x // size)
+        py = int(y // size)
+        # the furthest ring that still touches an occupied cell
+        last_ring = max(
+            px - self.min_cell[0], self.max_cell[0] - px,
+            py - self.min_cell[1], self.max_cell[1] - py, 0,
+        )
+        max_dist_sq = radius * radius if radius is not None else float("inf")
+
+        # (squared distance, insertion order, object) for everything found so far
+        found = []
+        order = 0
+        cells = self.cells
+        for ring in range(last_ring + 1):
+            # anything in this ring or beyond is at least this far away
+            # (less a pixel, as objects are bucketed by their rounded rect centre)
+            ring_dist = max(0, (ring - 1) * size - 1)
+            if ring_dist * ring_dist > max_dist_sq:
+                break
+            if len(found) >= k and ring_dist * ring_dist > found[k - 1][0]:
+                break
+
+            for cy in range(py - ring, py + ring + 1):
+                # only the edge cells of the ring are new
+                if cy in (py - ring, py + ring):
+                    xs = range(px - ring, px + ring + 1)
+                else:
+                    xs = (px - ring, px + ring) if ring else (px,)
+                for cx in xs:
+                    bucket = cells.get((cx, cy))
+                    if bucket is None:
+                        continue
+                    for obj in bucket:
+                        dx = obj.x - x
+                        dy = obj.y - y
+                        dist_sq = dx * dx + dy * dy
+                        if dist_sq <= max_dist_sq:
+                            found.append((dist_sq, order, obj))
+                            order += 1
+            found.sort(key=lambda item: (item[0], item[1]))
+            del found[k:]
+
+        return [obj for _, _, obj in found]
+
+    def colliding(self, rect):
+        """return the objects whose rect actually overlaps the given rectangle."""
+        return [obj for obj in self.query(rect) if obj.rect.colliderect(rect)]
+
+
+def overlapping_pairs(boxes, others, cell_size=app.GRID_CELL_SIZE):
+    """return every (box, other) pair of rectangles that overlap, in box order.
+
+    both batches are (left, top, right, bottom) tuples of int arrays, and the
+    result is two index arrays, one into each batch. the others are bucketed
+    by the cell of their top left corner, so each box only looks at the few
+    cells an overlapping rect could start in.
+    """
+    left, top, right, bottom = boxes
+    o_left, o_top, o_right, o_bottom = others
+    if not len(left) or not len(o_left):
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+
+    # sort the others by cell, the same way SpatialGrid.rebuild_from_keys() does
+    key_x = o_left // cell_size
+    key_y = o_top // cell_size
+    min_x = int(key_x.min())
+    min_y = int(key_y.min())
+    max_x = int(key_x.max())
+    max_y = int(key_y.max())
+    rows = max_y - min_y + 1
+    cell_ids = (key_x - min_x) * rows + (key_y - min_y)
+    order = np.argsort(cell_ids, kind="stable")
+    sorted_ids = cell_ids[order]
+
+    # a rect overlapping a box starts less than its own size before the box
+    x0 = (left - int((o_right - o_left).max()) + 1) // cell_size
+    y0 = (top - int((o_bottom - o_top).max()) + 1) // cell_size
+    x1 = (right - 1) // cell_size
+    y1 = (bottom - 1) // cell_size
+
+    found_boxes = []
+    found_others = []
+    for dx in range(int((x1 - x0).max()) + 1):
+        for dy in range(int((y1 - y0).max()) + 1):
+            cx = x0 + dx
+            cy = y0 + dy
+            inside = (cx <= x1) & (cy <= y1)
+            inside &= (cx >= min_x) & (cx <= max_x) & (cy >= min_y) & (cy <= max_y)
+            box_ids = np.flatnonzero(inside)
+            cell_ids = (cx[box_ids] - min_x) * rows + (cy[box_ids] - min_y)
+            starts = np.searchsorted(sorted_ids, cell_ids, side="left")
+            counts = np.searchsorted(sorted_ids, cell_ids, side="right") - starts
+            total = int(counts.sum())
+            if not total:
+                continue
+            # every (box, other in its cell) pair, by expanding each cell's range
+            pair_boxes = np.repeat(box_ids, counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            pair_others = order[np.repeat(starts, counts) + offsets]
+            hit = ((o_left[pair_others] < right[pair_boxes]) & (left[pair_boxes] < o_right[pair_others])
+                   & (o_top[pair_others] < bottom[pair_boxes]) & (top[pair_boxes] < o_bottom[pair_others]))
+            found_boxes.append(pair_boxes[hit])
+            found_others.append(pair_others[hit])
+
+    if not found_boxes:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+    found_boxes = np.concatenate(found_boxes)
+    found_others = np.concatenate(found_others)
+    by_box = np.argsort(found_boxes, kind="stable")
+    return found_boxes[by_box], found_others[by_box]
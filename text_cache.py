@@ -0,0 +1,56 @@
+from collections import OrderedDict
+
+import app
+
+
+class TextCache:
+    def __init__(self, max_size=app.TEXT_CACHE_SIZE):
+        """keep up to `max_size` rendered text surfaces, dropping the least recently used."""
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+
+    def __len__(self):
+        return len(self.surfaces)
+
+    def render(self, font, text, colour):
+        """return the antialiased surface for `text`, rendering it only the first time."""
+        key = (font, text, colour)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        surface = font.render(text, True, colour)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+
+class GlyphAtlas:
+    def __init__(self, font, colour, characters=app.ATLAS_CHARACTERS):
+        """pre-render every character once so strings can be drawn without the font."""
+        # render all the characters as one strip so they share a baseline, then
+        # cut the strip into one subsurface per character
+        self.strip = font.render(characters, True, colour)
+        self.height = self.strip.get_height()
+        self.glyphs = {}
+        x = 0
+        for ch in characters:
+            width = font.size(ch)[0]
+            self.glyphs[ch] = self.strip.subsurface((x, 0, width, self.height))
+            x += width
+
+    def size(self, text):
+        """return the (width, height) the text will take up when drawn."""
+        return sum(self.glyphs[ch].get_width() for ch in text), self.height
+
+    def draw(self, surface, text, dest):
+        """draw `text` with its top left corner at `dest` by blitting each glyph."""
+        x, y = dest
+        blit_sequence = []
+        for ch in text:
+            glyph = self.glyphs[ch]
+            blit_sequence.append((glyph, (x, y)))
+            x += glyph.get_width()
+        surface.blits(blit_sequence, doreturn=False)
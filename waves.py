@@ -0,0 +1,70 @@
+import app
+
+
+class WaveDirector:
+    def __init__(self, enemy_types, waves=app.WAVES, max_enemies=app.MAX_LIVE_ENEMIES,
+                 frame_budget=app.SPAWN_FRAME_BUDGET):
+        """decide when enemies spawn, working through a table of waves.
+
+        no more than `max_enemies` are ever alive at once. frame times
+        passed to report_frame_time() scale the spawn rate down while frames
+        go over `frame_budget` of a tick, and back up once they recover.
+        """
+        self.all_types = list(enemy_types)
+        self.waves = waves
+        self.max_enemies = max_enemies
+        self.frame_budget = frame_budget / app.TICK_RATE
+        self.reset()
+
+    def reset(self):
+        """start again from the first wave."""
+        self.wave_index = 0
+        # how many times the whole table has been played through
+        self.cycle = 0
+        self.wave_ticks = 0
+        self.spawn_timer = 0
+
+        # share of each wave's spawns that actually happen, lowered when
+        # frames run slow, with the left over fraction of an enemy carried on
+        self.rate = 1.0
+        self.credit = 0.0
+        self.average_frame_time = 0.0
+
+    @property
+    def wave(self):
+        return self.waves[self.wave_index]
+
+    @property
+    def enemy_types(self):
+        """the enemy types the current wave picks from."""
+        return self.wave["types"] or self.all_types
+
+    def report_frame_time(self, seconds):
+        """adjust the spawn rate to how long the last frame took to update and draw."""
+        self.average_frame_time += (seconds - self.average_frame_time) * 0.1
+        if self.average_frame_time > self.frame_budget:
+            self.rate = max(0.1, self.rate * 0.95)
+        elif self.average_frame_time < self.frame_budget * 0.75:
+            self.rate = min(1.0, self.rate + 0.01)
+
+    def spawn_count(self, live):
+        """advance one tick and return how many enemies to spawn on it."""
+        self.wave_ticks += 1
+        if self.wave_ticks >= self.wave["duration"]:
+            # move on to the next wave, going round again after the last one
+            self.wave_ticks = 0
+            self.spawn_timer = 0
+            self.wave_index += 1
+            if self.wave_index == len(self.waves):
+                self.wave_index = 0
+                self.cycle += 1
+
+        self.spawn_timer += 1
+        if self.spawn_timer < self.wave["interval"]:
+            return 0
+        self.spawn_timer = 0
+
+        self.credit += (self.wave["count"] + self.cycle) * self.rate
+        count = int(self.credit)
+        self.credit -= count
+        return max(0, min(count, self.max_enemies - live))
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+
+import numpy as np
+
+import app
+
+
+class TileWorld:
+    def __init__(self, floor_tiles, seed, width=app.WORLD_WIDTH, height=app.WORLD_HEIGHT,
+                 chunk_tiles=app.CHUNK_TILES, cache_size=app.CHUNK_CACHE_SIZE):
+        """a floor of random tiles covering the whole world, drawn a chunk at a time.
+
+        which tile goes where comes from the seed and the chunk's position, so
+        nothing is stored for the world itself. chunks are rendered the first
+        time they come into view and up to `cache_size` of them are kept,
+        dropping the least recently used.
+        """
+        self.floor_tiles = floor_tiles
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.chunk_tiles = chunk_tiles
+        self.cache_size = cache_size
+
+        self.tile_w = floor_tiles[0].get_width()
+        self.tile_h = floor_tiles[0].get_height()
+        self.chunk_w = self.tile_w * chunk_tiles
+        self.chunk_h = self.tile_h * chunk_tiles
+        # number of chunks across and down needed to cover the world
+        self.columns = -(-width // self.chunk_w)
+        self.rows = -(-height // self.chunk_h)
+
+        # (chunk x, chunk y) -> rendered chunk surface
+        self.chunks = OrderedDict()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def tile_indices(self, cx, cy):
+        """return which floor tile goes in each spot of chunk (cx, cy), by row."""
+        rng = np.random.default_rng((self.seed, cx, cy))
+        return rng.integers(0, len(self.floor_tiles), (self.chunk_tiles, self.chunk_tiles))
+
+    def chunk(self, cx, cy):
+        """return the rendered surface of chunk (cx, cy), rendering it if it isn't cached."""
+        key = (cx, cy)
+        surface = self.chunks.get(key)
+        if surface is not None:
+            self.chunks.move_to_end(key)
+            return surface
+
+        surface = app.pygame.Surface((self.chunk_w, self.chunk_h))
+        tiles = self.floor_tiles
+        surface.blits([
+            (tiles[index], (col * self.tile_w, row * self.tile_h))
+            for row, indices in enumerate(self.tile_indices(cx, cy).tolist())
+            for col, index in enumerate(indices)
+        ], doreturn=False)
+
+        self.chunks[key] = surface
+        if len(self.chunks) > self.cache_size:
+            self.chunks.popitem(last=False)
+        return surface
+
+    def draw(self, surface, view):
+        """draw the floor under `view` (a rect in world coordinates) onto `surface`.
+
+        anything outside the world is left black.
+        """
+        surface.fill((0, 0, 0))
+        # keep the part of a chunk hanging over the world's edge hidden
+        old_clip = surface.get_clip()
+        surface.set_clip(old_clip.clip((-view.left, -view.top, self.width, self.height)))
+        first_cx = max(0, view.left // self.chunk_w)
+        first_cy = max(0, view.top // self.chunk_h)
+        last_cx = min(self.columns - 1, (view.right - 1) // self.chunk_w)
+        last_cy = min(self.rows - 1, (view.bottom - 1) // self.chunk_h)
+        surface.blits([
+            (self.chunk(cx, cy), (cx * self.chunk_w - view.left, cy * self.chunk_h - view.top))
+            for cy in range(first_cy, last_cy + 1)
+            for cx in range(first_cx, last_cx + 1)
+        ], doreturn=False)
+        surface.set_clip(old_clip)